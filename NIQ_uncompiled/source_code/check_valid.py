@@ -1,10 +1,9 @@
 import time
-import datetime as dt
 from pathlib import Path
 from tkinter import messagebox
 import re
+import niq_ingest
 import niq_misc
-import math
 import traceback
 
 from niq_misc import replace_entry
@@ -87,155 +86,38 @@ def check_valid_main(gui, first_in=True, check_output=True):
     def check_input_file(gui):
         """
             Checks several aspects of the input file to ensure it is compatable with all downstream processing.
-            Also displays warnings for less severe format violations.
+            Also displays warnings for less severe format violations. The file is read only once; the parsed
+            data is stored in gui.ingest_report for use by init_master_df.
         """
 
-        def check_datetime_intervals():
-            """ Sets time interval between temperature readings and checks for gaps in date/time column. """
-
-            delta_secs = (datetimes[-1] - datetimes[0]).total_seconds()
-            interval = dt.timedelta(seconds=round(delta_secs / len(master_list)))
-
-            if not gui.show_warns_BV.get():
-                return True
-
-            # If interval is greater than or equal to one minute
-            if interval.seconds >= 60:
-                i = 1
-                while i < len(datetimes):
-                    if datetimes[i - 1] + interval != datetimes[i]:
-                        messagebox.showwarning(
-                            "Date/time Warning",
-                            f"{file_name_appendage}Discontinuous date/time found for data point {master_list[i][0]}." +
-                            "The run will continue, but this could cause inaccurate statistical output.",
-                        )
-                    i += 1
-                
-                return True
-
-            # If interval is less than one minute
-            # Identify first change in date/time
-            i = 0
-            while datetimes[i] == datetimes[0]:
-                i += 1
-
-            # Find least common denominator with one minute
-            LCD = abs(interval.seconds*60) // math.gcd(interval.seconds, 60)
-            dp_leap = int(LCD / interval.seconds) # There should be a whole number minute change after this many data points
-            min_leap = dt.timedelta(minutes=int(LCD / 60)) # That whole number of minutes is this
-
-            i += dp_leap
-            while i < len(datetimes):
-                if datetimes[i - dp_leap] + min_leap != datetimes[i]:
-                    messagebox.showwarning(
-                    "Date/time Warning",
-                    f"{file_name_appendage}Discontinuous date/time found for data point {master_list[i][0]}." +
-                    "The run will continue, but this could cause inaccurate statistical output.",
-                )
-                i += dp_leap
-
-            return True
-
-
         in_file_path = gui.active_input_path
         file_name_appendage = f"For file: {in_file_path.name} \n\n"
-        datetimes = []
+        gui.ingest_report = None
 
         if in_file_path.name == "":
             messagebox.showerror("Input error (Main tab)", "No input file provided.")
             return False
 
-        if not in_file_path.exists():
+        if not niq_ingest.input_exists(in_file_path):
             messagebox.showerror("Input File Error", "".join((file_name_appendage, "File with provided path could not be found.")))
             return False 
 
-        if in_file_path.suffix not in (".csv", ".html"):
-            messagebox.showerror("Input File Error", f'{file_name_appendage} Input file must have "csv" or "html" extension.')
+        data_suffix = niq_ingest.get_data_suffix(in_file_path)
+        if data_suffix not in niq_ingest.INPUT_SUFFIXES:
+            messagebox.showerror(
+                "Input File Error",
+                f'{file_name_appendage} Input file must have "csv" or "html" extension. '
+                + "CSV files may also be compressed (gz, bz2 or xz) or provided in a zip archive.",
+            )
             return False   
 
-        try:
-
-            # In the case of an HTML input, simply check for the presence of input file data
-            if in_file_path.suffix == ".html":
-                with open(in_file_path, "r") as f:
-                    content = f.read()
-
-                if "NestIQ input data" in content:
-                    return True
-                else:
-                    messagebox.showerror("Input File Error", f'{file_name_appendage} HTML file does not contain the necessary information for processing.')
-                    return False
-            
-            with open(in_file_path, "r") as f:
-                lines = f.readlines()
-
-            master_list = [line.strip().rstrip(",").split(",") for line in lines]
-
-            pop_indices = []
-            # Remove lines not conforming to expected format (such as headers)
-            for i in range(len(master_list[:-1])):
-                # Cells in data point column must contain only numbers
-                if not str(master_list[i][0]).isnumeric():
-                    pop_indices.append(i)
-
-            for pop_count, index in enumerate(pop_indices):
-                master_list.pop(index - pop_count)
-
-            master_list.pop(len(master_list) - 1)
-
-            prev_line = master_list[0]
-
-            if len(prev_line) < 3:
-                gui.air_valid = False
-
-            for line in master_list[1:]:
-                line = line[:4] if gui.air_valid else line[:3]
-
-                # Check if data points are continuous and sequential
-                try:
-                    if not int(line[0]) == (int(prev_line[0]) + 1):
-                        raise ValueError
-                except:
-                    messagebox.showerror(
-                        "Data Point Error",
-                        f"{file_name_appendage}Error after data point "
-                        + f"{prev_line[0]}. Data point number is not sequential with regard to previous data point.",
-                    )
-                    return False
-
-                # Test conversion of date/time string to datetime object
-                try:
-                    datetimes.append(niq_misc.convert_to_datetime(line[1]))
-                except ValueError:
-                    messagebox.showerror(
-                        "Date/Time Error", f"{file_name_appendage}Invalid date/time found for data point {line[0]}.  Date/Time should be in MM/DD/YYYY HH:MM (:SS) format."
-                    )
-                    return False
-
-                # Check egg temperatures column
-                try:
-                    float(line[2])
-                except:
-                    messagebox.showerror("Temperature Error", f"{file_name_appendage}Invalid temperature given for data point {line[0]}.")
-                    return False
-
-                # Check air temperatures column if appropriate
-                if gui.air_valid:
-                    try:
-                        float(line[3])
-                    except (IndexError, ValueError):
-                        gui.air_valid = False
-                        if gui.show_warns_BV.get():
-                            messagebox.showwarning(
-                                "Air Temperature Warning",
-                                f"{file_name_appendage}Invalid air temperature detected for data point "
-                                + f"{line[0]}. Air temperatures will not be plotted or included in statistical output.",
-                            )
-                prev_line = line
-
-            # Lastly, check if date/times are continuous
-            return check_datetime_intervals()
+        if data_suffix == ".html" and niq_ingest.is_compressed(in_file_path):
+            messagebox.showerror("Input File Error", f"{file_name_appendage} HTML plots cannot be compressed or provided in an archive.")
+            return False
 
+        try:
+            # Data prepared during a previous run with the same file and settings does not need to be re-read
+            report = gui.load_cached_input(in_file_path) or niq_ingest.ingest_file(in_file_path)
         except Exception as e:
             print(e)
             traceback.print_exc()
@@ -248,6 +130,21 @@ def check_valid_main(gui, first_in=True, check_output=True):
             )
             return False
 
+        gui.air_valid = report.air_valid
+
+        if not report.ok:
+            title, message = report.errors[0]
+            messagebox.showerror(title, f"{file_name_appendage}{message}")
+            return False
+
+        gui.ingest_report = report
+
+        if gui.show_warns_BV.get():
+            for title, message in report.warnings:
+                messagebox.showwarning(title, f"{file_name_appendage}{message}")
+
+        return True
+
     def check_out_file(gui, entry, title):
         """
             Checks if the name provided for a given output file is valid.  This includes asking the user if
@@ -397,6 +294,14 @@ def check_valid_adv(gui):
         messagebox.showerror("Parameter Error (Advanced tab)", "Standard deviations must be real numbers greater than 0.")
         return False
 
+    if gui.decode_posterior_BV.get():
+        try:
+            if not 0 < float(gui.posterior_thresh_E.get()) < 1:
+                raise ValueError("Posterior threshold outside of (0, 1) provided.")
+        except ValueError:
+            messagebox.showerror("Parameter Error (Advanced tab)", "Posterior threshold must be a real number between 0 and 1.")
+            return False
+
     return True
 
 def check_valid_plot_ops(gui):
@@ -74,6 +74,10 @@ def load_config(gui, program_startup=False, config_file_=None):
         replace_entry(gui.off_stdev_E, gui.config.get("Advanced Settings", "off_bout_emis_stdev"))
         replace_entry(gui.on_mean_E, gui.config.get("Advanced Settings", "on_bout_emis_mean"))
         replace_entry(gui.on_stdev_E, gui.config.get("Advanced Settings", "on_bout_emis_stdev"))
+        gui.decode_posterior_CB.select() if gui.config.get("Advanced Settings", "decode_by_posterior", fallback="False").lower() == "true" else gui.decode_posterior_CB.deselect()
+        replace_entry(gui.posterior_thresh_E, gui.config.get("Advanced Settings", "posterior_threshold", fallback="0.5"))
+        replace_entry(gui.restarts_E, gui.config.get("Advanced Settings", "training_restarts", fallback="1"))
+        gui.training_backend = gui.config.get("Advanced Settings", "training_backend", fallback="native")
         gui.manual_plot_dims.set(0) if gui.config.get("Plot Options", "manual_plot_dimensions").lower() == "false" else gui.manual_plot_dims.set(1)
         replace_entry(gui.plot_dim_x_E, gui.config.get("Plot Options", "plot_x_dim"))
         replace_entry(gui.plot_dim_y_E, gui.config.get("Plot Options", "plot_y_dim"))
@@ -234,6 +238,10 @@ def update_config(gui, config_file=None):
     gui.config.set("Advanced Settings", "off_bout_emis_stdev", gui.off_stdev_E.get())
     gui.config.set("Advanced Settings", "on_bout_emis_mean", gui.on_mean_E.get())
     gui.config.set("Advanced Settings", "on_bout_emis_stdev", gui.on_stdev_E.get())
+    gui.config.set("Advanced Settings", "decode_by_posterior", gui.decode_posterior_BV.get())
+    gui.config.set("Advanced Settings", "posterior_threshold", gui.posterior_thresh_E.get())
+    gui.config.set("Advanced Settings", "training_restarts", gui.restarts_E.get())
+    gui.config.set("Advanced Settings", "training_backend", gui.training_backend)
 
     gui.config.set("Plot Options", "manual_plot_dimensions", bool(gui.manual_plot_dims.get()))
     gui.config.set("Plot Options", "plot_x_dim", gui.plot_dim_x_E.get())
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Bump to invalidate all existing cache entries when the contents of stored files change
+CACHE_VERSION = 2
+
+# Size limit for the trained model cache
+MODEL_CACHE_MAX_BYTES = 5 * 2 ** 20
+
+# Size limit for the prepared input data cache
+INPUT_CACHE_MAX_BYTES = 200 * 2 ** 20
+
+
+def file_digest(path, chunk_size=2 ** 20):
+    """
+        Computes a SHA-256 digest of a file's contents.
+
+        Args:
+            path (str or pathlib.Path): file to hash
+            chunk_size (int): number of bytes read at a time
+    """
+
+    with open(path, "rb") as f:
+        return stream_digest(f, chunk_size)
+
+
+def stream_digest(f, chunk_size=2 ** 20):
+    """
+        Computes a SHA-256 digest of the remaining contents of a binary file object.
+
+        Args:
+            f (file object): opened for binary reading
+            chunk_size (int): number of bytes read at a time
+    """
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+        Builds a cache key from any number of JSON-serializable values (file digests, settings, etc.).
+    """
+
+    return hashlib.sha256(json.dumps([CACHE_VERSION] + list(parts), sort_keys=True).encode("utf8")).hexdigest()
+
+
+class DiskCache(object):
+    """
+        Stores one file per key in a directory. When the directory grows beyond max_bytes, the least recently used
+        entries (by modification time, which is refreshed on every hit) are deleted.
+
+        Attributes:
+            cache_dir (pathlib.Path): directory holding cache entries
+            max_bytes (int): size limit for all entries combined
+            suffix (str): file extension of cache entries
+    """
+
+    def __init__(self, cache_dir, max_bytes, suffix):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def get_path(self, key):
+        return self.cache_dir / (key + self.suffix)
+
+    def lookup(self, key):
+        """
+            Returns the path of the entry for key, or None if there is no such entry.
+
+            Args:
+                key (str)
+        """
+
+        path = self.get_path(key)
+        if not path.exists():
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return path
+
+    def store(self, key, write_func):
+        """
+            Creates or replaces the entry for key and evicts old entries if the size limit is exceeded.
+
+            Args:
+                key (str)
+                write_func (function): called with a path; writes the entry's contents to that path
+        """
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a uniquely named temporary file first so a partially written entry is never picked up, even
+        # when another process is storing the same key
+        path = self.get_path(key)
+        fd, temp_path = tempfile.mkstemp(dir=str(self.cache_dir), suffix=".tmp")
+        os.close(fd)
+        try:
+            write_func(Path(temp_path))
+            os.replace(temp_path, str(path))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self.evict()
+        return path
+
+    def evict(self):
+        """ Deletes least recently used entries until the cache is within its size limit. """
+
+        entries = []
+        for path in self.cache_dir.glob("*" + self.suffix):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+    def load_json(self, key):
+        """ Returns the deserialized entry for key, or None if absent or unreadable. """
+
+        path = self.lookup(key)
+        if path is None:
+            return None
+
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_json(self, key, obj):
+        """ Serializes obj as the entry for key. """
+
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(obj, f)
+
+        return self.store(key, write)
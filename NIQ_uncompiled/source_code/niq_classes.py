@@ -1,3 +1,4 @@
+import copy
 from pathlib import Path
 
 import numpy as np
@@ -25,45 +26,248 @@ class Vertex:
         return f"Index: {self.index}"
 
 
-class Bout:
+class BoutTable:
     """
-        Stores information for a single on or off-bout.
+        Stores every bout of an input file as parallel arrays. Bouts refer to their data points by index range into
+        temperature arrays shared with master_df, so temperatures are never copied per bout.
 
         Atributes:
-            first (int): index where the bout begins
-            last (int): index where the bout ends
-            bout_type (int): off or on
-            dur (int): duration in number of data points
-            mean_egg_temper (float)
-            egg_temper_stdev (float)
-            mean_air_temper (float)
-            air_temper_stdev (float)
-            egg_tempers (list of floats): list of egg temperatures for each data point in bout
+            first (numpy array): index where each bout begins
+            last (numpy array): index where each bout ends
+            middle (numpy array): index halfway between first and last (rounded half to even)
+            bout_type (numpy array): off or on
+            duration (numpy array): duration in minutes
+            temper_change (numpy array): egg temperature at last minus egg temperature at first
+            is_daytime (numpy array): True if middle falls in the daytime period
+            date (numpy array): date of middle (datetime.date)
+            egg_tempers (numpy array): egg_temper column of master_df
+            air_tempers (numpy array): air_temper column of master_df
+            p_on (numpy array): p_on column of master_df (None if posteriors are unavailable)
     """
 
-    def __init__(self, gui, first_, last_, bout_type_):
+    # Attributes holding one value per bout
+    bout_attrs = ("first", "last", "middle", "bout_type", "duration", "temper_change", "is_daytime", "date")
+
+    def __init__(self, master_df, first_, last_, bout_type_, time_interval):
+        self.egg_tempers = master_df["egg_temper"].to_numpy()
+        self.air_tempers = master_df["air_temper"].to_numpy()
+        self.p_on = master_df["p_on"].to_numpy() if "p_on" in master_df.columns else None
+
         self.first = first_
         self.last = last_
-        self.middle = int(round(np.mean([first_, last_])))
+        self.middle = np.rint((first_ + last_) / 2).astype(int)
         self.bout_type = bout_type_
-        self.is_daytime = gui.master_df.loc[self.middle, "is_daytime"]
-        self.dur = gui.time_interval * (last_ - first_) / 60
-        self.mean_egg_temper = None
-        self.egg_temper_stdev = None
-        self.mean_air_temper = None
-        self.air_temper_stdev = None
+        self.duration = time_interval * (last_ - first_) / 60
+        self.temper_change = self.egg_tempers[last_] - self.egg_tempers[first_]
+        self.is_daytime = master_df["is_daytime"].to_numpy()[self.middle]
+        self.date = pd.DatetimeIndex(master_df["date_time"].to_numpy()[self.middle]).date
+
+    def __len__(self):
+        return len(self.first)
+
+    def __getitem__(self, key):
+        """
+            Selects bouts by slice or boolean mask. The selection shares the temperature arrays of this table.
+        """
+
+        subset = copy.copy(self)
+        for attr in self.bout_attrs:
+            setattr(subset, attr, getattr(self, attr)[key])
+
+        return subset
+
+    @property
+    def lengths(self):
+        """ Number of data points in each bout """
+        return self.last - self.first + 1
+
+    def get_tempers(self, i, tempers):
+        """
+            Returns a view (not a copy) of the values falling within bout i.
+
+            Args:
+                i (int): position of the bout in this table
+                tempers (numpy array): egg_tempers, air_tempers or p_on
+        """
+
+        return tempers[self.first[i] : self.last[i] + 1]
+
+    def get_sums(self, values):
+        """
+            Sums values over every bout with a single np.add.reduceat call.
+
+            Args:
+                values (numpy array): array aligned with master_df (e.g. egg_tempers)
+        """
 
-        # Flag convert to series
-        
-        self.egg_tempers = gui.master_df.loc[self.first : self.last, "egg_temper"].tolist()
-        self.mean_egg_temper = round(np.mean(self.egg_tempers), 3)
-        self.egg_temper_stdev = round(pd.Series(self.egg_tempers).std(), 3)
-        self.air_tempers = gui.master_df.loc[self.first : self.last, "air_temper"].tolist()
-        self.mean_air_temper = round(np.mean(self.air_tempers), 3)
-        self.air_temper_stdev = round(pd.Series(self.air_tempers).std(), 3)
-        self.temper_change = gui.master_df.loc[self.last, "egg_temper"] - gui.master_df.loc[self.first, "egg_temper"]
+        if len(self) == 0:
+            return np.zeros(0, dtype=values.dtype)
 
-        self.main_date = gui.master_df.loc[self.middle, "date_time"].date()
+        # Bout boundaries alternate with the boundaries of the gaps between bouts, whose sums are discarded
+        bounds = np.column_stack((self.first, self.last + 1)).ravel()
+        if bounds[-1] == len(values):
+            bounds = bounds[:-1]
+
+        return np.add.reduceat(values, bounds)[::2]
+
+    def get_means(self, values):
+        """
+            Mean of values within each bout.
+
+            Args:
+                values (numpy array): array aligned with master_df
+        """
+
+        return self.get_sums(values) / self.lengths.astype(values.dtype)
+
+    def get_stdevs(self, values):
+        """
+            Sample standard deviation of values within each bout (NaN for bouts of a single data point).
+
+            Args:
+                values (numpy array): array aligned with master_df
+        """
+
+        lengths = self.lengths
+        if len(self) == 0:
+            return np.zeros(0)
+
+        # Deviations from the bout mean are gathered for the data points within bouts only
+        bout_indices = np.arange(lengths.sum()) + np.repeat(self.first - (np.cumsum(lengths) - lengths), lengths)
+        sq_deviations = (values[bout_indices] - np.repeat(self.get_means(values), lengths)) ** 2
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(np.add.reduceat(sq_deviations, np.cumsum(lengths) - lengths) / (lengths - 1))
+
+    def get_pooled_mean(self, values):
+        """
+            Mean of values across every data point of every bout in this table.
+
+            Args:
+                values (numpy array): array aligned with master_df
+        """
+
+        return self.get_sums(values).sum() / self.lengths.sum()
+
+    def get_confidences(self):
+        """
+            Mean posterior probability of the assigned state for each bout (None if posteriors are unavailable).
+        """
+
+        if self.p_on is None:
+            return None
+
+        return np.where(self.bout_type == "on", self.get_means(self.p_on), self.get_means(1 - self.p_on))
+
+
+class TemperIndex:
+    """
+        Prefix sums over the temperature columns of master_df. Statistics for any index range are read from two
+        entries of each cumulative array, so they cost the same for a single bout as for an entire input file.
+        Squared values are accumulated as deviations from the column mean to keep them precise.
+
+        Range statistics are returned as moments: (count, mean, sum of squared deviations from the mean).
+
+        Atributes:
+            day_counts (numpy array): cumulative count of daytime data points
+            centers (dict): mean of each temperature column
+            sums (dict): cumulative sum of deviations from centers for each temperature column
+            sq_sums (dict): cumulative sum of squared deviations from centers for each temperature column
+            day_sums (dict): as sums but for daytime data points only
+            day_sq_sums (dict): as sq_sums but for daytime data points only
+            above_counts (numpy array): cumulative count of egg temperatures above the time above threshold
+            below_counts (numpy array): cumulative count of egg temperatures below the time below threshold
+    """
+
+    temper_cols = ("egg_temper", "air_temper")
+
+    def __init__(self, master_df, above_temper, below_temper):
+        is_daytime = master_df["is_daytime"].to_numpy(dtype=bool)
+        self.day_counts = self.cumulate(is_daytime)
+
+        self.centers, self.sums, self.sq_sums, self.day_sums, self.day_sq_sums = {}, {}, {}, {}, {}
+        for col in self.temper_cols:
+            tempers = master_df[col].to_numpy(dtype=float)
+            self.centers[col] = tempers.mean() if len(tempers) > 0 else 0.0
+
+            deviations = tempers - self.centers[col]
+            sq_deviations = deviations ** 2
+            self.sums[col] = self.cumulate(deviations)
+            self.sq_sums[col] = self.cumulate(sq_deviations)
+            self.day_sums[col] = self.cumulate(np.where(is_daytime, deviations, 0))
+            self.day_sq_sums[col] = self.cumulate(np.where(is_daytime, sq_deviations, 0))
+
+        egg_tempers = master_df["egg_temper"].to_numpy()
+        self.above_counts = self.cumulate(egg_tempers > above_temper)
+        self.below_counts = self.cumulate(egg_tempers < below_temper)
+
+    @staticmethod
+    def cumulate(values):
+        """ Cumulative sum with a leading zero, so the total of values[i:j] is result[j] - result[i] """
+        return np.concatenate(([0], np.cumsum(values)))
+
+    def get_moments(self, col, first, last, daytime=None):
+        """
+            Moments of a temperature column over the data points from first to last (inclusive).
+
+            Args:
+                col (str): egg_temper or air_temper
+                first (int): index where the range begins
+                last (int): index where the range ends
+                daytime (bool): if True or False, only daytime or only nighttime data points are included
+        """
+
+        stop = last + 1
+        count = stop - first
+        sum_ = self.sums[col][stop] - self.sums[col][first]
+        sq_sum = self.sq_sums[col][stop] - self.sq_sums[col][first]
+
+        if daytime is not None:
+            day_count = self.day_counts[stop] - self.day_counts[first]
+            day_sum = self.day_sums[col][stop] - self.day_sums[col][first]
+            day_sq_sum = self.day_sq_sums[col][stop] - self.day_sq_sums[col][first]
+            if daytime:
+                count, sum_, sq_sum = day_count, day_sum, day_sq_sum
+            else:
+                count, sum_, sq_sum = count - day_count, sum_ - day_sum, sq_sum - day_sq_sum
+
+        if count == 0:
+            return 0, None, 0.0
+
+        return int(count), self.centers[col] + sum_ / count, max(sq_sum - sum_ ** 2 / count, 0.0)
+
+    def count_above(self, first, last):
+        """ Number of egg temperatures above the time above threshold from first to last (inclusive) """
+        return int(self.above_counts[last + 1] - self.above_counts[first])
+
+    def count_below(self, first, last):
+        """ Number of egg temperatures below the time below threshold from first to last (inclusive) """
+        return int(self.below_counts[last + 1] - self.below_counts[first])
+
+    @staticmethod
+    def pool_moments(moments):
+        """
+            Combines the moments of disjoint ranges (possibly from different input files) into those of their union.
+
+            Args:
+                moments (list of tuples): (count, mean, sum of squared deviations) of each range
+        """
+
+        moments = [moment for moment in moments if moment[0] > 0]
+        count = sum(moment[0] for moment in moments)
+        if count == 0:
+            return 0, None, 0.0
+
+        mean = sum(n * range_mean for n, range_mean, _ in moments) / count
+        sq_dev = sum(range_sq_dev + n * (range_mean - mean) ** 2 for n, range_mean, range_sq_dev in moments)
+
+        return count, mean, sq_dev
+
+    @staticmethod
+    def get_stdev(moments):
+        """ Sample standard deviation from moments with a count of at least two """
+        count, _, sq_dev = moments
+        return np.sqrt(sq_dev / (count - 1))
 
 
 class Block:
@@ -75,10 +279,11 @@ class Block:
                 last (int): index where the block ends
                 partial_day (bool): True if block does not represent a full 24 hr day
                 date (string)
-                egg_tempers (list of floats)
-                air_tempers (list of floats)
-                vertices (list of Vertices): every Vertex object falling into the scope of this block
-                bouts (list of Bouts): every Bout object falling into the scope of this block
+                bouts (BoutTable): every bout falling into the scope of this block
+                egg_moments (tuple): moments of egg temperature across the block (see TemperIndex)
+                egg_moments_day (tuple): moments of daytime egg temperature
+                egg_moments_night (tuple): moments of nighttime egg temperature
+                air_moments (tuple): moments of air temperature across the block
                 off_count (int): total number of off-bouts
                 mean_off_dur (float): mean off-bout duration
                 off_dur_stdev (float): standard deviation of off-bout durations
@@ -114,13 +319,12 @@ class Block:
         self.partial_day = partial_day_
         self.date = ""
 
-        self.egg_tempers = []
-        self.air_tempers = []
-        self.vertices = []
-        self.bouts = []
+        self.bouts = None
         self.bout_df = pd.DataFrame()
-        self.bout_tempers = pd.DataFrame()
-        self.block_tempers = pd.DataFrame()
+        self.egg_moments = None
+        self.egg_moments_day = None
+        self.egg_moments_night = None
+        self.air_moments = None
 
         self.off_count = 0
         self.mean_off_dur = None
@@ -169,40 +373,35 @@ class Block:
     def get_sub_dfs(self, gui):
         """
             bout_df columns:
+                date
                 duration
-                egg_temper
-                air_temper
                 temper_change
                 type
                 is_daytime
-            
-            bout_tempers columns:
-                egg_temper
-                air_temper
-                type
-                is_daytime
+        """
 
-            block_tempers columns:
-                egg_temper
-                air_temper
-                is_daytime
+        self.bout_df = pd.DataFrame({
+            "date": self.bouts.date,
+            "duration": self.bouts.duration,
+            "temper_change": self.bouts.temper_change,
+            "type": self.bouts.bout_type,
+            "is_daytime": self.bouts.is_daytime,
+        })
+
+    def get_tempers(self, gui, col, daytime=None):
         """
+            Returns the temperatures of this block as a view of master_df's column, without copying.
 
-        self.bout_df["date"] = [bout.main_date for bout in self.bouts]
-        self.bout_df["duration"] = [bout.dur for bout in self.bouts]
-        self.bout_df["egg_temper"] = [bout.egg_tempers for bout in self.bouts]
-        self.bout_df["air_temper"] = [bout.air_tempers for bout in self.bouts]
-        self.bout_df["temper_change"] = [bout.temper_change for bout in self.bouts]
-        self.bout_df["type"] = [bout.bout_type for bout in self.bouts]
-        self.bout_df["is_daytime"] = [bout.is_daytime for bout in self.bouts]
+            Args:
+                col (str): egg_temper or air_temper
+                daytime (bool): if True or False, only daytime or only nighttime data points are returned (copied)
+        """
 
-        self.bout_tempers["egg_temper"] = [temper for bout in self.bouts for temper in bout.egg_tempers]
-        self.bout_tempers["air_temper"] = [temper for bout in self.bouts for temper in bout.air_tempers]
-        self.bout_tempers["type"] = [bout.bout_type for bout in self.bouts for _ in range(len(bout.egg_tempers))]
+        tempers = gui.master_df[col].to_numpy()[self.first : self.last + 1]
+        if daytime is None:
+            return tempers
 
-        self.block_tempers["egg_temper"] = gui.master_df[self.first : self.last + 1]["egg_temper"]
-        self.block_tempers["air_temper"] = gui.master_df[self.first : self.last + 1]["air_temper"]
-        self.block_tempers["is_daytime"] = gui.master_df[self.first : self.last + 1]["is_daytime"]
+        return tempers[gui.master_df["is_daytime"].to_numpy()[self.first : self.last + 1] == daytime]
 
     def get_stats(self, gui):
         """
@@ -213,26 +412,27 @@ class Block:
 
         self.date = gui.master_df.loc[self.first, "date_time"].strftime(r"%m/%d/%Y")
 
-        self.off_count = len([bout for bout in self.bouts if bout.bout_type == "off"])
-        self.on_count = len([bout for bout in self.bouts if bout.bout_type == "on"])
+        self.off_count = int((self.bout_df["type"] == "off").sum())
+        self.on_count = int((self.bout_df["type"] == "on").sum())
 
-        # This sets the temper containers to Series
-        self.egg_tempers = gui.master_df.loc[self.first : self.last, "egg_temper"]
-        self.air_tempers = gui.master_df.loc[self.first : self.last, "air_temper"]
+        # Means and standard deviations are taken from the prefix sums of the current input file
+        index = gui.temper_index
+        self.egg_moments = index.get_moments("egg_temper", self.first, self.last)
+        self.egg_moments_day = index.get_moments("egg_temper", self.first, self.last, daytime=True)
+        self.egg_moments_night = index.get_moments("egg_temper", self.first, self.last, daytime=False)
+        self.air_moments = index.get_moments("air_temper", self.first, self.last)
 
         # Get number of data points passing threshold and multiply by duration
-        data_points_above_temper = len(self.egg_tempers.loc[self.egg_tempers > float(gui.time_above_temper_E.get())])
-        data_points_below_temper = len(self.egg_tempers.loc[self.egg_tempers < float(gui.time_below_temper_E.get())])
-        self.time_above_temper = data_points_above_temper * gui.time_interval / 60
-        self.time_below_temper = data_points_below_temper * gui.time_interval / 60
+        self.time_above_temper = index.count_above(self.first, self.last) * gui.time_interval / 60
+        self.time_below_temper = index.count_below(self.first, self.last) * gui.time_interval / 60
 
         # Get off-bout stats
         if self.off_count > 0:
             off_bout_df = self.bout_df[self.bout_df["type"] == "off"]
-            off_tempers_df = self.bout_tempers[self.bout_tempers["type"] == "off"]
+            off_bouts = self.bouts[self.bouts.bout_type == "off"]
             self.mean_off_dur = round(off_bout_df["duration"].mean(), 2)
             self.mean_off_dec = round(off_bout_df["temper_change"].mean(), 3)
-            self.mean_off_temper = round(off_tempers_df["egg_temper"].mean(), 3)
+            self.mean_off_temper = round(off_bouts.get_pooled_mean(off_bouts.egg_tempers), 3)
             self.off_time_sum = round(off_bout_df["duration"].sum().mean(), 2)
             if self.off_count > 1:
                 self.off_dur_stdev = round(off_bout_df["duration"].std(), 2)
@@ -241,47 +441,51 @@ class Block:
         # Get on-bout stats
         if self.on_count > 0:
             on_bout_df = self.bout_df[self.bout_df["type"] == "on"]
-            on_tempers_df = self.bout_tempers[self.bout_tempers["type"] == "on"]
+            on_bouts = self.bouts[self.bouts.bout_type == "on"]
             self.mean_on_dur = round(on_bout_df["duration"].mean(), 2)
             self.mean_on_inc = round(on_bout_df["temper_change"].mean(), 3)
-            self.mean_on_temper = round(on_tempers_df["egg_temper"].mean(), 3)
+            self.mean_on_temper = round(on_bouts.get_pooled_mean(on_bouts.egg_tempers), 3)
             self.on_time_sum = round(on_bout_df["duration"].sum().mean(), 2)
             if self.on_count > 1:
                 self.on_dur_stdev = round(on_bout_df["duration"].std(), 2)
                 self.on_inc_stdev = round(on_bout_df["temper_change"].std(), 3)
 
-        # Calculate egg temperature statistics
-        if len(self.block_tempers) > 1:
-            self.mean_egg_temper = round(self.block_tempers["egg_temper"].mean(), 3)
-            self.median_temper = round(self.block_tempers["egg_temper"].median(), 3)
-            self.min_egg_temper = self.block_tempers["egg_temper"].min()
-            self.max_egg_temper = self.block_tempers["egg_temper"].max()
-            self.egg_temper_stdev = round(self.block_tempers["egg_temper"].std(), 3)
-
-        # Calculate air temperature statistics
-        if gui.air_valid and len(self.block_tempers) > 1:
-            self.mean_air_temper = round(self.block_tempers["air_temper"].mean(), 3)
-            self.min_air_temper = self.block_tempers["air_temper"].min()
-            self.max_air_temper = self.block_tempers["air_temper"].max()
-            self.air_temper_stdev = round(self.block_tempers["air_temper"].std(), 3)
+        # Calculate egg temperature statistics (median, min and max still require the temperatures themselves)
+        if self.egg_moments[0] > 1:
+            egg_tempers = self.get_tempers(gui, "egg_temper")
+            self.mean_egg_temper = round(self.egg_moments[1], 3)
+            self.median_temper = round(np.nanmedian(egg_tempers), 3)
+            self.min_egg_temper = np.nanmin(egg_tempers)
+            self.max_egg_temper = np.nanmax(egg_tempers)
+            self.egg_temper_stdev = round(index.get_stdev(self.egg_moments), 3)
+
+        # Calculate air temperature statistics (min and max are kept without valid air temperatures, as
+        # MultiFileStats takes them across every input file)
+        if self.air_moments[0] > 1:
+            air_tempers = self.get_tempers(gui, "air_temper")
+            self.min_air_temper = np.nanmin(air_tempers)
+            self.max_air_temper = np.nanmax(air_tempers)
+            if gui.air_valid:
+                self.mean_air_temper = round(self.air_moments[1], 3)
+                self.air_temper_stdev = round(index.get_stdev(self.air_moments), 3)
 
         # Calculate daytime egg temperature statistics
-        egg_tempers_day = self.block_tempers[self.block_tempers["is_daytime"] == True]
-        if len(egg_tempers_day) > 1:
-            self.mean_egg_temper_day = round(egg_tempers_day["egg_temper"].mean(), 3)
-            self.median_egg_temper_day = round(egg_tempers_day["egg_temper"].median(), 3)
-            self.min_egg_temper_day = egg_tempers_day["egg_temper"].min()
-            self.max_egg_temper_day = egg_tempers_day["egg_temper"].max()
-            self.egg_temper_stdev_day = round(egg_tempers_day["egg_temper"].std(), 3)
+        if self.egg_moments_day[0] > 1:
+            egg_tempers_day = self.get_tempers(gui, "egg_temper", daytime=True)
+            self.mean_egg_temper_day = round(self.egg_moments_day[1], 3)
+            self.median_egg_temper_day = round(np.nanmedian(egg_tempers_day), 3)
+            self.min_egg_temper_day = np.nanmin(egg_tempers_day)
+            self.max_egg_temper_day = np.nanmax(egg_tempers_day)
+            self.egg_temper_stdev_day = round(index.get_stdev(self.egg_moments_day), 3)
 
         # Calculate nighttime egg temperature statistics
-        egg_tempers_night = self.block_tempers[self.block_tempers["is_daytime"] == False]
-        if len(egg_tempers_night) > 1:
-            self.mean_egg_temper_night = round(egg_tempers_night["egg_temper"].mean(), 3)
-            self.median_egg_temper_night = round(egg_tempers_night["egg_temper"].median(), 3)
-            self.min_egg_temper_night = egg_tempers_night["egg_temper"].min()
-            self.max_egg_temper_night = egg_tempers_night["egg_temper"].max()
-            self.egg_temper_stdev_night = round(egg_tempers_night["egg_temper"].std(), 3)
+        if self.egg_moments_night[0] > 1:
+            egg_tempers_night = self.get_tempers(gui, "egg_temper", daytime=False)
+            self.mean_egg_temper_night = round(self.egg_moments_night[1], 3)
+            self.median_egg_temper_night = round(np.nanmedian(egg_tempers_night), 3)
+            self.min_egg_temper_night = np.nanmin(egg_tempers_night)
+            self.max_egg_temper_night = np.nanmax(egg_tempers_night)
+            self.egg_temper_stdev_night = round(index.get_stdev(self.egg_moments_night), 3)
 
         for index in gui.bouts_dropped_locs:
             if index >= self.first and index <= self.last:
@@ -315,8 +519,6 @@ class MultiFileStats:
 
         self.blocks = []
         self.bout_df = pd.DataFrame()
-        self.bout_tempers = pd.DataFrame()
-        self.block_tempers = pd.DataFrame()
 
         self.off_count = 0
         self.mean_off_dur = None
@@ -350,7 +552,12 @@ class MultiFileStats:
 
     def get_stats(self, gui):
         self.bout_df = pd.concat([block.bout_df for block in self.blocks])
-        self.block_tempers = pd.concat([block.block_tempers for block in self.blocks])
+
+        # Temperature means and standard deviations are pooled from the moments of each block
+        egg_moments = TemperIndex.pool_moments([block.egg_moments for block in self.blocks])
+        egg_moments_day = TemperIndex.pool_moments([block.egg_moments_day for block in self.blocks])
+        egg_moments_night = TemperIndex.pool_moments([block.egg_moments_night for block in self.blocks])
+        air_moments = TemperIndex.pool_moments([block.air_moments for block in self.blocks])
 
         self.off_count = np.sum([block.off_count for block in self.blocks])
         if self.off_count > 1:
@@ -370,28 +577,26 @@ class MultiFileStats:
 
         self.date_count = np.sum([block.date_count for block in self.blocks])
 
-        if len(self.block_tempers) > 1:
-            self.mean_egg_temper = round(self.block_tempers["egg_temper"].mean(), 3)
-            self.egg_temper_stdev = round(self.block_tempers["egg_temper"].std(), 3)
-            self.min_egg_temper = self.block_tempers["egg_temper"].min()
-            self.max_egg_temper = self.block_tempers["egg_temper"].max()
+        if egg_moments[0] > 1:
+            self.mean_egg_temper = round(egg_moments[1], 3)
+            self.egg_temper_stdev = round(TemperIndex.get_stdev(egg_moments), 3)
+            self.min_egg_temper = min(block.min_egg_temper for block in self.blocks if block.min_egg_temper is not None)
+            self.max_egg_temper = max(block.max_egg_temper for block in self.blocks if block.max_egg_temper is not None)
 
-        egg_tempers_day = self.block_tempers[self.block_tempers["is_daytime"] == True]
-        if len(egg_tempers_day) > 1:
-            self.mean_daytime_egg_temper = round(egg_tempers_day["egg_temper"].mean(), 3)
-            self.daytime_egg_temper_stdev = round(egg_tempers_day["egg_temper"].std(), 3)
+        if egg_moments_day[0] > 1:
+            self.mean_daytime_egg_temper = round(egg_moments_day[1], 3)
+            self.daytime_egg_temper_stdev = round(TemperIndex.get_stdev(egg_moments_day), 3)
 
-        egg_tempers_night = self.block_tempers[self.block_tempers["is_daytime"] == False]
-        if len(egg_tempers_night) > 1:
-            self.mean_nighttime_egg_temper = round(egg_tempers_night["egg_temper"].mean(), 3)
-            self.nighttime_egg_temper_stdev = round(egg_tempers_night["egg_temper"].std(), 3)
+        if egg_moments_night[0] > 1:
+            self.mean_nighttime_egg_temper = round(egg_moments_night[1], 3)
+            self.nighttime_egg_temper_stdev = round(TemperIndex.get_stdev(egg_moments_night), 3)
 
         # Calculate air temperature statistics
-        if gui.air_valid and len(self.block_tempers) > 1:
-            self.mean_air_temper = round(self.block_tempers["air_temper"].mean(), 3)
-            self.air_temper_stdev = round(self.block_tempers["air_temper"].std(), 3)
-            self.min_air_temper = self.block_tempers["air_temper"].min()
-            self.max_air_temper = self.block_tempers["air_temper"].max()
+        if gui.air_valid and air_moments[0] > 1:
+            self.mean_air_temper = round(air_moments[1], 3)
+            self.air_temper_stdev = round(TemperIndex.get_stdev(air_moments), 3)
+            self.min_air_temper = min(block.min_air_temper for block in self.blocks if block.min_air_temper is not None)
+            self.max_air_temper = max(block.max_air_temper for block in self.blocks if block.max_air_temper is not None)
 
     def write(self, gui):
         """
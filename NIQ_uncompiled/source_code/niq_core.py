@@ -1,5 +1,4 @@
-import datetime
-import json
+import multiprocessing
 import subprocess
 import time
 import tkinter as tk
@@ -13,24 +12,17 @@ import pandas as pd
 from PIL import Image, ImageTk
 from termcolor import colored
 
+import niq_cache
 import niq_classes
 import niq_hmm
+import niq_ingest
 import niq_misc
 import testing
 from check_valid import (check_valid_adv, check_valid_main,
                          check_valid_plot_ops, check_valid_stat_ops,
                          check_valid_vertex_file)
 from configuration import init_config, load_config, save_config, set_defaults
-from niq_misc import convert_to_datetime, remove_curly, replace_entry, set_unique_path
-
-root = tk.Tk()
-STANDARD_FONT = font.Font(size=10)
-HELP_FONT = font.Font(size=8)
-HEADER_FONT = font.Font(size=12, weight="bold")
-SUBHEADER_FONT = "Helvetica 10 bold"
-TITLE_FONT = ("Helvetica", 18)
-
-root.iconbitmap(Path.cwd().parent / "misc_files" / "NestIQ.ico")
+from niq_misc import remove_curly, replace_entry, set_unique_path
 
 
 class GUIClass:
@@ -54,15 +46,27 @@ class GUIClass:
         self.multi_in_on_incs = []
         self.multi_in_day_tempers = []
         self.multi_in_night_tempers = []
-        self.multi_in_air_tempers = []
         self.multi_in_full_day_count = 0
 
         self.time_interval = None
+        self.training_backend = niq_hmm.DEFAULT_TRAINING_BACKEND
         self.air_valid = True
+        self.ingest_report = None
         self.bouts_dropped_locs = set()
+        self.temper_index = None
 
         self.master_hmm = niq_hmm.HMM()
 
+        # Trained models are stored by input file content and training settings
+        self.model_cache = niq_cache.DiskCache(
+            self.master_dir_path / "misc_files" / "cache" / "models", niq_cache.MODEL_CACHE_MAX_BYTES, ".json"
+        )
+
+        # Prepared master DataFrames are stored by input file content and the settings used to prepare them
+        self.input_cache = niq_cache.DiskCache(
+            self.master_dir_path / "misc_files" / "cache" / "inputs", niq_cache.INPUT_CACHE_MAX_BYTES, ".npz"
+        )
+
         # Configure root
         self.root.wm_title("NestIQ")
         self.root.geometry("370x720")
@@ -243,6 +247,11 @@ class GUIClass:
         UL_train_B.grid(row=5, sticky="W", padx=10, pady=(10, 0))
         UL_train_B.configure(background="white")
 
+        restarts_L = tk.Label(tab2, text="Restarts:", font=STANDARD_FONT)
+        restarts_L.grid(row=5, sticky="W", padx=170, pady=(10, 0))
+        self.restarts_E = tk.Entry(tab2, width=5)
+        self.restarts_E.grid(row=5, sticky="W", padx=233, pady=(10, 0))
+
         # ----- Supervised learning -----
         SL_train_B = tk.Button(tab2, text="Supervised Learning", command=(lambda: self.supervised_learning()))
         SL_train_B.grid(row=6, sticky="W", padx=10, pady=(10, 0))
@@ -341,6 +350,13 @@ class GUIClass:
         self.on_stdev_E = tk.Entry(tab2, width=10)
         self.on_stdev_E.grid(row=27, sticky="W", padx=220)
 
+        # ----- Posterior decoding -----
+        self.decode_posterior_BV = tk.BooleanVar()
+        self.decode_posterior_CB = tk.Checkbutton(tab2, text="Decode by posterior threshold:", variable=self.decode_posterior_BV, font=STANDARD_FONT)
+        self.decode_posterior_CB.grid(row=28, sticky="W", padx=10, pady=(20, 0))
+        self.posterior_thresh_E = tk.Entry(tab2, width=10)
+        self.posterior_thresh_E.grid(row=28, sticky="W", padx=220, pady=(20, 0))
+
         # ----------------------------------------------- Plot Options tab -----------------------------------------------
         # ----- Header -----
         tab3_BG = tk.Label(tab3, text="", bg="red4")
@@ -817,7 +833,7 @@ class GUIClass:
 
         if len(input_paths) == 1:
             # Update default output file names
-            stem = Path(input_paths[0]).stem
+            stem = niq_ingest.get_input_stem(Path(input_paths[0]))
             out_dir = self.master_dir_path / "output_files"
             set_unique_path(self.plot_file_E, out_dir / (stem + "_plot"), ".html")
             set_unique_path(self.stats_file_E, out_dir / (stem + "_stats"), ".csv")
@@ -863,7 +879,6 @@ class GUIClass:
         self.multi_in_on_incs = []
         self.multi_in_day_tempers = []
         self.multi_in_night_tempers = []
-        self.multi_in_air_tempers = []
         self.multi_in_full_day_count = 0
 
     def select_vertices(self):
@@ -895,10 +910,13 @@ class GUIClass:
         niq_misc.generate_plot(self, days_list, edit_mode=True, out_path=path)
 
     def parse_input_file_entry(self):
-        """ Splits input file entry box into individual input paths if present. """
+        """
+            Splits input file entry box into individual input paths if present. Zip archives are replaced by the
+            CSV files they contain.
+        """
 
         paths = [Path(path) for path in self.input_file_E.get().split(" | ")]
-        return paths
+        return niq_ingest.expand_input_paths(paths)
 
     def set_active_input(self, path, replace_out=False):
         """ Sets parameters based on single input file currently being analyzed. """
@@ -909,8 +927,9 @@ class GUIClass:
         if replace_out:
             # Update default output file names
             out_dir = self.master_dir_path / "output_files"
-            set_unique_path(self.plot_file_E, out_dir / (path.stem + "_plot"), ".html")
-            set_unique_path(self.stats_file_E, out_dir / (path.stem + "_stats"), ".csv")
+            stem = niq_ingest.get_input_stem(path)
+            set_unique_path(self.plot_file_E, out_dir / (stem + "_plot"), ".html")
+            set_unique_path(self.stats_file_E, out_dir / (stem + "_stats"), ".csv")
 
 
     # Ensure valid parameters and execute processing
@@ -954,7 +973,7 @@ class GUIClass:
 
                 self.master_df = self.init_master_df(path)
 
-                if path.suffix == ".html":
+                if niq_ingest.get_data_suffix(path) == ".html":
                     custom_verts = niq_misc.get_verts_from_html(self, self.input_file_E.get())
                     if custom_verts is None: break
                     self.master_df = self.add_states(verts=custom_verts)
@@ -964,8 +983,16 @@ class GUIClass:
                     self.master_hmm.normalize_params(self)
                     self.master_hmm.populate_hmm_entries(self)
 
+                    # Posterior probability of each data point being on-bout
+                    self.master_df["p_on"] = self.master_hmm.posterior(self.master_df)
+
                     # Adds state column to master_df of input file
-                    results = self.master_hmm.decode(self.master_df)
+                    if self.decode_posterior_BV.get():
+                        thresh = float(self.posterior_thresh_E.get())
+                        results = self.master_hmm.decode_by_posterior(self.master_df["p_on"].values, thresh)
+                    else:
+                        results = self.master_hmm.decode(self.master_df)
+
                     self.master_df = self.add_states(states=results)
 
                 try:
@@ -977,7 +1004,7 @@ class GUIClass:
             if self.multi_in_stats_BV.get():
                 self.multi_file_stats.write(self)
 
-            replace_entry(self.input_file_E, " | ".join([str(path) for path in in_file_paths]))
+            replace_entry(self.input_file_E, " | ".join([str(in_path) for in_path in in_file_paths]))
 
             self.run_B["text"] = "Run"
             self.run_B.config(bg="red4", fg="white", width=10, height=1)
@@ -1014,7 +1041,7 @@ class GUIClass:
 
         if self.restrict_search_BV.get():
             filt = master_df["is_daytime"] == False
-            master_df.loc[filt, "bout_state"] = "None"
+            master_df.loc[filt, "bout_state"] = niq_misc.NO_STATE
 
         return master_df
 
@@ -1027,39 +1054,82 @@ class GUIClass:
                 auto_run (bool): False if this function call is from clicking button on the Advanced tab
 		"""
 
+        try:
+            restarts = int(self.restarts_E.get())
+            if restarts < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Parameter Error (Advanced tab)", "Number of restarts must be an integer greater than 0.")
+            return False
+
         self.run_B["text"] = "Learning..."
         self.run_B.config(bg="gray", fg="white", width=10, height=1)
         self.root.update()
 
         in_file_paths = self.parse_input_file_entry()
-        self.set_active_input(in_file_paths[0], replace_out=False)
+        active_path = getattr(self, "active_input_path", in_file_paths[0])
+        active_air_valid = getattr(self, "air_valid", True)
+        active_report = getattr(self, "ingest_report", None)
 
-        if len(in_file_paths) > 1:
-            messagebox.showerror(
-                ("Unsupervised Learning Error"), "Multiple input files provided. Unsupervised learning currently only supports single input files."
-            )
+        def restore_active_input():
+            """ Restores the state of the file being analyzed (auto_run) or the full input file entry. """
 
-            self.run_B["text"] = "Run"
-            self.run_B.config(bg="red4", fg="white", width=10, height=1)
-            self.run = False
-            return False
+            if auto_run:
+                self.set_active_input(active_path, replace_out=False)
+                self.air_valid = active_air_valid
+                self.ingest_report = active_report
+            else:
+                replace_entry(self.input_file_E, " | ".join([str(in_path) for in_path in in_file_paths]))
 
-        # If auto_run, check_valid_main will be called in trigger_run
-        if not auto_run:
-            if not check_valid_main(self, check_output=False):
-                self.run_B["text"] = "Run"
-                self.run_B.config(bg="red4", fg="white", width=10, height=1)
-                self.run = False
-                self.root.update()
-                return False
+        # Files that cannot be read or settings that cannot be parsed are reported by validation below
+        try:
+            cache_key = self.get_model_cache_key("unsupervised", in_file_paths, restarts, self.training_backend)
+        except (OSError, ValueError):
+            cache_key = None
 
-        in_file = self.input_file_E.get()
-        self.master_df = self.init_master_df(in_file)
+        cached_params = self.model_cache.load_json(cache_key) if cache_key is not None else None
 
         self.master_hmm = niq_hmm.HMM()
-        emis_arr = self.master_df.loc[:, "delta_temper"].to_numpy()
-        emis_arr = emis_arr.reshape(-1, 1)
-        self.master_hmm.baum_welch(emis_arr)
+        if cached_params is not None:
+            # Cached models are only stored for input files that passed validation
+            print("Loaded trained model from cache")
+            self.master_hmm.from_dict(cached_params)
+        else:
+            # Each file is validated and loaded in a single read. Only the emission vector of each file is
+            # retained; the full DataFrame is discarded after extraction.
+            emis_arrays = []
+            lengths = []
+            for path in in_file_paths:
+                self.set_active_input(path, replace_out=False)
+                self.air_valid = True
+
+                # If auto_run, check_valid_main has already been called on the active file in trigger_run
+                if auto_run and path == active_path:
+                    self.air_valid = active_air_valid
+                    self.ingest_report = active_report
+                elif not check_valid_main(self, check_output=False):
+                    restore_active_input()
+                    self.run_B["text"] = "Run"
+                    self.run_B.config(bg="red4", fg="white", width=10, height=1)
+                    self.run = False
+                    self.root.update()
+                    return False
+
+                emis_arrays.append(self.init_master_df(path).loc[:, "delta_temper"].to_numpy(dtype=float))
+                lengths.append(len(emis_arrays[-1]))
+
+            print(f"Training on {len(lengths)} file(s), {sum(lengths)} data points")
+
+            emis_arr = np.concatenate(emis_arrays).reshape(-1, 1)
+            if restarts > 1:
+                self.master_hmm.baum_welch_restarts(emis_arr, lengths=lengths, restarts=restarts, backend=self.training_backend)
+            else:
+                self.master_hmm.baum_welch(emis_arr, lengths=lengths, backend=self.training_backend)
+
+            if cache_key is not None:
+                self.cache_model(cache_key)
+
+        restore_active_input()
         self.master_hmm.populate_hmm_entries(self)
 
         self.run_B["text"] = "Run"
@@ -1085,6 +1155,15 @@ class GUIClass:
         if not check_valid_vertex_file(self) or not check_valid_main(self, check_output=False):
             return
 
+        cache_key = self.get_model_cache_key("supervised", in_file_paths, niq_cache.file_digest(self.vertex_file_E.get()))
+        cached_params = self.model_cache.load_json(cache_key)
+        if cached_params is not None:
+            print("Loaded trained model from cache")
+            self.master_hmm = niq_hmm.HMM()
+            self.master_hmm.from_dict(cached_params)
+            self.master_hmm.populate_hmm_entries(self)
+            return
+
         self.master_df = self.init_master_df(self.input_file_E.get())
         training_verts = niq_misc.get_verts_from_html(self, self.vertex_file_E.get())
         if training_verts is None: return
@@ -1094,8 +1173,100 @@ class GUIClass:
         reduced_df = self.master_df.iloc[training_verts[0].index:training_verts[-1].index + 1]
         self.master_hmm.extract_params_from_verts(reduced_df)
         self.master_hmm.normalize_params(self)
+        self.cache_model(cache_key)
         self.master_hmm.populate_hmm_entries(self)
 
+    def get_model_cache_key(self, mode, in_file_paths, *extra):
+        """
+            Builds the key under which a trained model is cached from the contents of the input file(s) and the
+            settings that affect training.
+
+            Args:
+                mode (str): "unsupervised" or "supervised"
+                in_file_paths (list of pathlib.Paths): input files used for training
+                extra: any additional values the trained model depends on
+        """
+
+        return niq_cache.make_key(
+            mode,
+            [niq_ingest.input_digest(path) for path in in_file_paths],
+            int(float(self.smoothing_radius_E.get())),
+            int(self.train_from_IV.get()),
+            self.day_start_E.get(),
+            self.night_start_E.get(),
+            *extra
+        )
+
+    def cache_model(self, cache_key):
+        """
+            Saves the parameters of master_hmm to the model cache. Failing to do so does not interrupt training.
+
+            Args:
+                cache_key (str): output of get_model_cache_key
+        """
+
+        try:
+            self.model_cache.store_json(cache_key, self.master_hmm.to_dict())
+        except OSError:
+            traceback.print_exc()
+            print("Trained model could not be cached")
+
+    def get_input_cache_key(self, in_path):
+        """
+            Builds the key under which the prepared master DataFrame for an input file is cached from the contents
+            of the file and the settings used to prepare it. Air temperature validity is determined by the file
+            contents and so is covered by the file digest.
+
+            Args:
+                in_path (str or pathlib.Path): input file
+        """
+
+        return niq_cache.make_key(
+            "input",
+            niq_ingest.input_digest(Path(in_path)),
+            int(float(self.smoothing_radius_E.get())),
+            int(self.train_from_IV.get()),
+            self.day_start_E.get(),
+            self.night_start_E.get(),
+        )
+
+    def load_cached_input(self, in_path):
+        """
+            Returns an IngestReport holding the prepared master DataFrame for in_path if one is cached, else None.
+
+            Args:
+                in_path (str or pathlib.Path): input file
+        """
+
+        try:
+            cache_path = self.input_cache.lookup(self.get_input_cache_key(in_path))
+            if cache_path is None:
+                return None
+
+            return niq_ingest.load_prepared(cache_path, in_path)
+        except (OSError, ValueError, KeyError):
+            traceback.print_exc()
+            print("Cached input data could not be loaded")
+            return None
+
+    def cache_input(self, in_path, report, master_df):
+        """
+            Saves a prepared master DataFrame to the input cache. Failing to do so does not interrupt the run.
+
+            Args:
+                in_path (str or pathlib.Path): input file
+                report (IngestReport): report master_df was built from
+                master_df (DataFrame): output of init_master_df
+        """
+
+        try:
+            self.input_cache.store(
+                self.get_input_cache_key(in_path), lambda path: niq_ingest.save_prepared(path, report, master_df)
+            )
+        except (OSError, ValueError):
+            traceback.print_exc()
+            print("Input data could not be cached")
+
     def init_master_df(self, in_path):
         """
             Adds all columns barring bout_state
@@ -1113,151 +1284,100 @@ class GUIClass:
                 smoothed_adj_temper = adj_temper with rolling mean applied
                 delta_temper = change in smoothed_adj_temper or smoothed_egg_temper
                 is_daytime = True if datapoint falls in daytime time range
-                bout_state = on, off or None for nighttime data points in a restricted analysis
+                bout_state = niq_misc.OFF, ON or NO_STATE for nighttime data points in a restricted analysis
+
+            Derived temperature columns are stored as float32 and bout_state as int8 to reduce memory use.
         """
         def add_daytime(df):
             """
-                Analyze dates of master DataFrame and parse row data into daytime and nighttime block objects.
+                Flags data points falling within the daytime period defined by the user.
             """
 
-            def is_daytime(date_time):
-                """
-                    Check if a given time falls within the daytime period defined by the user.
-
-                    Args:
-                            date_time (datetime.datetime)
-                """
-
-                time = date_time.time()
-                # When the start of daytime is earlier in the day than the start of nighttime
-                if day_start < night_start:
-                    if time >= day_start and time < night_start:
-                        return True
-                # When the start of nighttime is earlier in the day than the start of daytime
-                elif night_start < day_start:
-                    if not (time >= night_start and time < day_start):
-                        return True
-
-                return False
+            def get_time_of_day(entry):
+                time = niq_misc.convert_to_datetime(f"01/01/2020 {str(entry.get())}").time()
+                return pd.Timedelta(hours=time.hour, minutes=time.minute, seconds=time.second)
 
             # Create time objects from entry box values
-            day_start = niq_misc.convert_to_datetime(f"01/01/2020 {str(self.day_start_E.get())}").time()
-            night_start = niq_misc.convert_to_datetime(f"01/01/2020 {str(self.night_start_E.get())}").time()
-
-            df["is_daytime"] = df["date_time"].apply(is_daytime)
+            day_start = get_time_of_day(self.day_start_E)
+            night_start = get_time_of_day(self.night_start_E)
+
+            time_of_day = df["date_time"] - df["date_time"].dt.normalize()
+            # When the start of daytime is earlier in the day than the start of nighttime
+            if day_start < night_start:
+                df["is_daytime"] = (time_of_day >= day_start) & (time_of_day < night_start)
+            # When the start of nighttime is earlier in the day than the start of daytime
+            elif night_start < day_start:
+                df["is_daytime"] = ~((time_of_day >= night_start) & (time_of_day < day_start))
+            else:
+                df["is_daytime"] = False
 
             return df
 
-        def html_to_df(path):
-            with open(path, "r") as f:
-                lines = f.readlines()
-
-            i = lines.index("<!--NestIQ input data\n") + 1
-            json_str = lines[i][:-1]
-            input_dict = json.loads(json_str)
-            size = len(input_dict["egg_temper"])
-
-            # Restore data point column
-            dp_start = int(input_dict["first_dp"])
-            dp_stop = dp_start + size
-            input_dict["data_point"] = list(range(dp_start, dp_stop))
-
-            # Restore date/time column
-            first_dt = niq_misc.convert_to_datetime(input_dict["first_dt"])
-            time_d = datetime.timedelta(seconds=int(input_dict["dt_interval"]))
-            input_dict["date_time"] = [first_dt + (x * time_d) for x in range(0, size)]
-
-            df = pd.DataFrame({
-                "data_point": input_dict["data_point"],
-                "date_time": input_dict["date_time"],
-                "egg_temper": input_dict["egg_temper"],
-                "air_temper": input_dict["air_temper"]
-                })
-        
-            return df
+        in_path = Path(in_path)
 
+        # Reuse the data parsed while validating the input file if available
+        report = getattr(self, "ingest_report", None)
+        self.ingest_report = None
+        if report is None or report.path != in_path:
+            report = self.load_cached_input(in_path) or niq_ingest.ingest_file(in_path)
+            if not report.ok:
+                raise ValueError(f"{in_path.name}: {report.errors[0][1]}")
 
-        def csv_to_df(path):
-            try:
-                df = pd.read_csv(path)
-            except UnicodeDecodeError:
-                # Attempt to convert file encoding to UTF-8
-                temp_path = self.master_dir_path / "misc_files" / "temp_input.csv"
-                with open(in_path, "r") as original_file, open(temp_path, "w", encoding="utf8") as mod_file:
-                    mod_file.write(original_file.read())
+            self.air_valid = report.air_valid
 
-                df = pd.read_csv(temp_path)
+        self.time_interval = report.time_interval
+        if report.logger_format is not None:
+            print(f"{in_path.name}: detected {report.logger_format} export")
 
-            return df
+        print("interval =", self.time_interval, "seconds")
 
-        in_path = Path(in_path)
-        if in_path.suffix == ".html":
-            df = html_to_df(str(in_path))
-        else:
-            df = csv_to_df(str(in_path))
+        # Log any lines of the input file that were skipped or partially discarded
+        for line in report.get_rejection_log():
+            print(line)
 
-        # Remove partial rows
-        df = df.iloc[:, :(3 + int(self.air_valid))].dropna()
+        if report.gaps is not None and len(report.gaps) > 0:
+            print(f"{in_path.name}: {len(report.gaps)} date/time discontinuities")
+            print(report.gaps.to_string(index=False))
 
-        # Set time interval
-        delta_secs = (convert_to_datetime(df.iloc[-1, 1]) - convert_to_datetime(df.iloc[0, 1])).total_seconds()
-        self.time_interval = round(delta_secs / len(df))
-        print("interval =", self.time_interval, "seconds")
+        # Data loaded from the input cache has already been fully prepared
+        if report.master_df is not None:
+            print("Loaded prepared input data from cache")
+            return report.master_df
+
+        # Columns are added to the ingested frame one at a time rather than copying the whole frame
+        df = report.df
 
         # Fill air_temper column with 0's if none provided
         if not self.air_valid:
-            df.loc[:, "air_temper"] = 0
-
-        # Remove any "extra" columns
-        if len(df.columns) > 4:
-            df = df.iloc[:, :4]
-
-        # Rename columns
-        old_col_names = list(df.columns)
-        col_names = ["data_point", "date_time", "egg_temper", "air_temper"]
-        col_rename_dict = {old: new for old, new in zip(old_col_names, col_names)}
-        df.rename(columns=col_rename_dict, inplace=True)
-
-        # Set any data_point, egg_temper or air_temper cells with non-number values to NaN
-        numeric_cols = col_names[:1] + col_names[2:]
-        for col in numeric_cols:
-            filt = df[col].astype(str).apply(niq_misc.is_number)
-            df.loc[~filt, col] = np.NaN
-
-        # Delete any rows containing NaN value
-        df.dropna(inplace=True)
-
-        # Convert column object types
-        df["data_point"] = df["data_point"].astype(int)
-        df["date_time"] = df["date_time"].apply(niq_misc.convert_to_datetime)
-        df["egg_temper"] = df["egg_temper"].astype(float).round(4)
-        df["air_temper"] = df["air_temper"].astype(float).round(4)
-
-        # Reassign data_point column to be continuous
-        start = int(df["data_point"].iloc[0])
-        new_col = range(start, (start + len(df)))
-        df["data_point"] = new_col
-            
-
-        # Add adjusted (egg - air temperature) temperatures column
-        df["adj_temper"] = (df["egg_temper"] - df["air_temper"]).round(4)
-
-        # Add smoothed temperatures columns
+            df["air_temper"] = 0.0
+
+        # Adjusted (egg - air temperature) temperatures
+        adj_temper = (df["egg_temper"] - df["air_temper"]).round(4)
+
+        # Smoothed temperatures
         radius = int(self.smoothing_radius_E.get())
-        df["smoothed_egg_temper"] = niq_misc.smooth_series(radius, df["egg_temper"]).round(4)
-        df["smoothed_adj_temper"] = niq_misc.smooth_series(radius, df["adj_temper"]).round(4)
+        smoothed_egg_temper = niq_misc.smooth_series(radius, df["egg_temper"]).round(4)
+        smoothed_adj_temper = niq_misc.smooth_series(radius, adj_temper).round(4)
 
-        # Add column storing difference in adjusted temperature from previous entry to current
-        df["delta_temper"] = np.zeros(df.shape[0])
-        emission_source = "smoothed_adj_temper" if int(self.train_from_IV.get()) == 1 else "smoothed_egg_temper"
-        df.iloc[1:, df.columns.get_loc("delta_temper")] = df[emission_source].diff()
+        # Difference in adjusted temperature from previous entry to current
+        emission_source = smoothed_adj_temper if int(self.train_from_IV.get()) == 1 else smoothed_egg_temper
+        delta_temper = emission_source.diff()
 
         # Set first cell equal to second
-        df.iloc[0, df.columns.get_loc("delta_temper")] = df.iloc[1, df.columns.get_loc("delta_temper")]
+        delta_temper.iloc[0] = delta_temper.iloc[1]
+
+        # Compact storage for columns only used for plotting; delta_temper keeps full precision for the model
+        df["data_point"] = df["data_point"].astype(np.int32)
+        df["adj_temper"] = adj_temper.astype(np.float32)
+        df["smoothed_egg_temper"] = smoothed_egg_temper.astype(np.float32)
+        df["smoothed_adj_temper"] = smoothed_adj_temper.astype(np.float32)
+        df["delta_temper"] = delta_temper
 
         df = add_daytime(df)
 
-        return df.reset_index(drop=True)
+        self.cache_input(in_path, report, df)
+
+        return df
     
 
     def add_states(self, verts=None, states=None):
@@ -1274,33 +1394,29 @@ class GUIClass:
         # Appends state values based on vertex locations
         if verts is not None:
 
-            self.master_df["bout_state"] = "None"
-
-            state = "off"  # Assume off-bout start -- is corrected by "swap_params_by_state" if necessary
-
             # Create list of vertex indices
             indices = [0]
             indices += [vert.index for vert in verts]
             indices.append(len(self.master_df))
 
-            prev_i = indices[0]
-            for next_i in indices[1:]:
-                self.master_df.loc[prev_i : next_i - 1, "bout_state"] = state
-
-                # Set up for next round
-                prev_i = next_i
-                state = "off" if state == "on" else "on"
+            # States alternate between segments, assuming an off-bout start -- is corrected below if necessary
+            segment_lens = np.diff(indices)
+            segment_states = np.arange(len(segment_lens)) % 2
+            self.master_df["bout_state"] = np.repeat(segment_states, segment_lens).astype(np.int8)
 
         # If states are provided, simply append
         if states is not None:
-            self.master_df.loc[:, "bout_state"] = states
-            self.master_df.loc[:, "bout_state"].replace([0, 1, 2], ["off", "on", "None"], inplace=True)
+            self.master_df["bout_state"] = np.asarray(states, dtype=np.int8)
 
         # Flip bout states if necessary
-        on_bout_delta_temp = self.master_df.loc[self.master_df["bout_state"] == "on", "delta_temper"].mean()
-        off_bout_delta_temp = self.master_df.loc[self.master_df["bout_state"] == "off", "delta_temper"].mean()
+        bout_states = self.master_df["bout_state"]
+        on_bout_delta_temp = self.master_df.loc[bout_states == niq_misc.ON, "delta_temper"].mean()
+        off_bout_delta_temp = self.master_df.loc[bout_states == niq_misc.OFF, "delta_temper"].mean()
         if off_bout_delta_temp > on_bout_delta_temp:
-            self.master_df.loc[:, "bout_state"].replace(["off", "on", "None"], ["on", "off", "None"], inplace=True)
+            flipped = np.where(bout_states == niq_misc.NO_STATE, niq_misc.NO_STATE, niq_misc.ON - bout_states)
+            self.master_df["bout_state"] = flipped.astype(np.int8)
+            if "p_on" in self.master_df.columns:
+                self.master_df["p_on"] = 1 - self.master_df["p_on"]
 
         return self.master_df
 
@@ -1309,11 +1425,12 @@ def main(gui):
     """
         Pior to entering this function, master_df has be fully constructed including the annotation of bout_state,
         and daytime/nighttime status for the entiere dataset, regardless of daytime restriction. First, any data points
-        corrisponding to nighttime have their bout_state set to None. A master block is constructed which covers the
-        entire dataset. The vertices for this Block are acquired by searching for changes in bout state (e.g. "off" to 
-        "on" or "on" to None). Bouts are subsequently extracted from these vertices. Statistics for this block represent
-        the dataset as a whole. Later individual Blocks are created for each date represented in the input data. These 
-        blocks have their bouts extracted from the pool of bouts already identified in the master_block.
+        corrisponding to nighttime have their bout_state set to None and bouts shorter than the duration threshold are
+        merged into their neighbors. A master block is constructed which covers the entire dataset. The bouts for this
+        Block are acquired in one pass by splitting bout_state into runs of identical states (e.g. "off" until the
+        next "on" or None). Statistics for this block represent the dataset as a whole. Later individual Blocks are
+        created for each date represented in the input data. These blocks have their bouts extracted from the pool of
+        bouts already identified in the master_block.
 
         Args:
             gui (GUIClass)
@@ -1321,26 +1438,23 @@ def main(gui):
     
     gui.master_df = gui.erase_nighttime_state(gui.master_df)
 
-    # Store all vertices in master block object for later allocation
-    gui.master_block = niq_classes.Block(gui, 0, len(gui.master_df) - 1, False)
-    gui.master_block.vertices = niq_misc.get_verts_from_master_df(gui.master_df)
-    gui.master_block.bouts = niq_misc.get_bouts_from_verts(gui, gui.master_block.vertices)
-
+    # Bouts failing the duration threshold are merged into their neighbors before bouts are extracted
     gui.master_df, gui.bouts_dropped_locs = niq_misc.filter_by_dur(gui)
 
-    # FLAG - need to figure out how to reduce this redundancy
+    # Prefix sums shared by every Block of this input file for range temperature statistics
+    gui.temper_index = niq_classes.TemperIndex(
+        gui.master_df, float(gui.time_above_temper_E.get()), float(gui.time_below_temper_E.get())
+    )
+
+    # Store all bouts in master block object for later allocation
     gui.master_block = niq_classes.Block(gui, 0, len(gui.master_df) - 1, False)
-    gui.master_block.vertices = niq_misc.get_verts_from_master_df(gui.master_df)
-    gui.master_block.bouts = niq_misc.get_bouts_from_verts(gui, gui.master_block.vertices)
+    gui.master_block.bouts = niq_misc.get_bouts_from_master_df(gui, gui.master_df)
 
     gui.master_block.get_stats(gui)
     file_bouts = gui.master_block.bouts
 
     gui.multi_file_stats.add_block(gui.master_block)
 
-    if gui.air_valid:
-        gui.multi_in_air_tempers += gui.master_block.air_tempers.tolist()
-
     # Create blocks each date represented in input file
     date_block_list = niq_misc.get_date_blocks(gui)
     for date_block in date_block_list:
@@ -1355,5 +1469,18 @@ def main(gui):
 
 
 if __name__ == "__main__":
+    # Required for worker processes (multi-restart training) in frozen executables
+    multiprocessing.freeze_support()
+
+    # The root window is only created in the main process so that worker processes do not open a GUI
+    root = tk.Tk()
+    STANDARD_FONT = font.Font(size=10)
+    HELP_FONT = font.Font(size=8)
+    HEADER_FONT = font.Font(size=12, weight="bold")
+    SUBHEADER_FONT = "Helvetica 10 bold"
+    TITLE_FONT = ("Helvetica", 18)
+
+    root.iconbitmap(Path.cwd().parent / "misc_files" / "NestIQ.ico")
+
     gui = GUIClass(root)
     root.mainloop()
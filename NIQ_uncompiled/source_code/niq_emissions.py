@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+from scipy.special import log_ndtr
+
+
+def get_log_emission_matrix(emis_array, emissions):
+    """
+        Computes the log probability of every emission (temperature change) under each hidden state.
+
+        Off-bouts are modeled by the upper tail of their distribution and on-bouts by the lower tail, so larger
+        temperature increases are increasingly likely to be on-bouts. Probabilities are computed with a
+        numerically stable log-CDF, which stays finite far into either tail and so requires no pseudocount.
+
+        Args:
+            emis_array (numpy array): vector of temperature change values
+            emissions (dict of dicts): "mean" and "stdev" for each state (0 = off-bout, 1 = on-bout)
+
+        Returns:
+            log_emis (numpy array): N x 2 array of natural log probabilities, column index = state
+    """
+
+    emis_array = np.asarray(emis_array, dtype=float).ravel()
+    log_emis = np.empty((len(emis_array), 2))
+
+    for state in (0, 1):
+        z = (emis_array - float(emissions[state]["mean"])) / float(emissions[state]["stdev"])
+        log_emis[:, state] = log_ndtr(z) if state == 1 else log_ndtr(-z)
+
+    return log_emis
+
+
+def get_gaussian_log_pdf_matrix(emis_array, means, variances):
+    """
+        Computes the log density of every emission under a normal distribution for each hidden state. This is the
+        emission model fit by Baum Welch training.
+
+        Args:
+            emis_array (numpy array): vector of temperature change values
+            means (numpy array): mean for each state
+            variances (numpy array): variance for each state
+
+        Returns:
+            log_pdf (numpy array): N x 2 array of natural log densities, column index = state
+    """
+
+    emis_array = np.asarray(emis_array, dtype=float).ravel()
+    log_pdf = np.empty((len(emis_array), 2))
+
+    for state in (0, 1):
+        mean, var = float(np.ravel(means)[state]), float(np.ravel(variances)[state])
+        log_pdf[:, state] = -0.5 * (math.log(2 * math.pi * var) + (emis_array - mean) ** 2 / var)
+
+    return log_pdf
@@ -1,12 +1,24 @@
 import math
-import statistics
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
-from hmmlearn import hmm
 
+import niq_emissions
 import niq_misc
 from niq_misc import replace_entry
 
+# Inputs longer than this (in data points) are decoded with checkpointed Viterbi
+VITERBI_CHUNK_SIZE = 200000
+
+# Convergence threshold (gain in log-likelihood per iteration) for multi-restart training
+RESTART_TOL = 1e-4
+
+# Baum Welch implementation: "native" (TwoStateGaussianHMM) or "hmmlearn" (hmmlearn.hmm.GaussianHMM)
+TRAINING_BACKENDS = ("native", "hmmlearn")
+DEFAULT_TRAINING_BACKEND = "native"
+
 
 class HMM(object):
     """
@@ -18,6 +30,7 @@ class HMM(object):
             _trans_probs (dict of dicts): state transition probabilities
             _emissions (dict of dicts): state emission probabilities
             _dur_thresh (int): minimum duration (in data points) for a bout to be kept
+            _training_history (list of floats): log-likelihood after each iteration of the last Baum Welch fit
     """
 
     def __init__(self):
@@ -26,92 +39,165 @@ class HMM(object):
         self._trans_probs = {0: {}, 1: {}}
         self._emissions = {0: {}, 1: {}}
         self._dur_thresh = None
+        self._training_history = []
 
-    def baum_welch(self, emis_array):
+    def baum_welch(self, emis_array, lengths=None, tol=1e-100, n_iter=1000, backend=DEFAULT_TRAINING_BACKEND):
         """
             Determine ideal HMM parameters by the Baum Welch unsupervised learning algorithm.
 
             Args:
                 emis_array (numpy array): vector of temperature change values
+                lengths (list of ints): length of each independent sequence (input file) concatenated in
+                    emis_array; transitions are not modeled across sequence boundaries
+                tol (float): convergence threshold for the gain in log-likelihood between iterations
+                n_iter (int): maximum number of iterations
+                backend (str): "native" or "hmmlearn"
         """
 
-        def set_params(self, model):
-            """
-                Converts HMM parameters from hmmlearn into a format compatable with the rest of NestIQ.
+        run_start = time.time()
 
-                Args:
-                    model (hmmlearn.GaussianHMM)
-            """
+        model = new_training_model(backend, tol, n_iter)
+        set_starting_params(model, emis_array)
 
-            self._initial = model.startprob_
+        model.fit(emis_array, lengths)
+        self.set_params_from_model(model)
 
-            self._trans_probs = {}
-            self._trans_probs[0] = {}
-            self._trans_probs[1] = {}
+        converged = "converged" if model.monitor_.converged else "did not converge"
+        print(
+            f"Baum Welch ({backend}): {model.monitor_.iter} iterations ({converged}) in {round(time.time() - run_start, 2)} seconds,",
+            f"log-likelihood = {round(model.monitor_.history[-1], 3)}"
+        )
 
-            self._trans_probs[0][0] = model.transmat_[0, 0]
-            self._trans_probs[0][1] = model.transmat_[0, 1]
-            self._trans_probs[1][1] = model.transmat_[1, 1]
-            self._trans_probs[1][0] = model.transmat_[1, 0]
+    def baum_welch_restarts(
+        self, emis_array, lengths=None, restarts=4, tol=RESTART_TOL, n_iter=1000, processes=None, backend=DEFAULT_TRAINING_BACKEND
+    ):
+        """
+            Runs the Baum Welch algorithm from several starting points in parallel and keeps the model with the
+            highest log-likelihood. The first restart uses the same starting parameters as baum_welch; the rest
+            are randomized. Each fit stops once the log-likelihood improves by less than tol.
 
-            self._emissions[0] = {}
-            self._emissions[1] = {}
-            self._emissions[0]["mean"] = model.means_[0][0]
-            self._emissions[1]["mean"] = model.means_[1][0]
-            self._emissions[0]["stdev"] = model.covars_[0][0][0]
-            self._emissions[1]["stdev"] = model.covars_[1][0][0]
+            Args:
+                emis_array (numpy array): vector of temperature change values
+                lengths (list of ints): length of each independent sequence (input file) concatenated in emis_array
+                restarts (int): number of independent fits
+                tol (float): convergence threshold for the gain in log-likelihood between iterations
+                n_iter (int): maximum number of iterations per fit
+                processes (int): number of worker processes (defaults to one per restart, up to the CPU count)
+                backend (str): "native" or "hmmlearn"
+        """
 
-        model = hmm.GaussianHMM(n_components=2, tol=1e-100, n_iter=1000, algorithm="baum_welch", init_params="")
+        if processes is None:
+            processes = min(restarts, os.cpu_count() or 1)
+
+        run_start = time.time()
+        best = None
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                executor.submit(fit_restart, emis_array, lengths, (None if i == 0 else i), tol, n_iter, backend): i
+                for i in range(restarts)
+            }
+
+            for future in as_completed(futures):
+                model, log_likelihood, iters, secs = future.result()
+                converged = "converged" if model.monitor_.converged else "did not converge"
+                print(
+                    f"Restart {futures[future] + 1}: {iters} iterations ({converged}) in {round(secs, 2)} seconds,",
+                    f"log-likelihood = {round(log_likelihood, 3)}"
+                )
+
+                # Ties go to the lowest restart number so results do not depend on completion order
+                if best is None or (log_likelihood, -futures[future]) > (best[0], -best[1]):
+                    best = (log_likelihood, futures[future], model)
+
+        print(f"Best restart: {best[1] + 1} ({restarts} restarts in {round(time.time() - run_start, 2)} seconds)")
+        self.set_params_from_model(best[2])
+
+    def set_params_from_model(self, model):
+        """
+            Converts HMM parameters from hmmlearn into a format compatable with the rest of NestIQ.
 
-        # Provide inital values
-        model.startprob_ = np.array([0.5, 0.5])
-        model.transmat_ = np.array([[0.98, 0.02], [0.02, 0.98]])
-        # model.transmat_ = np.array([[0.9999, 0.0001], [0.0001, 0.9999]])
-        model.means_ = np.array([[0.001], [-0.001]])
-        model.covars_ = np.array([[0.001], [0.001]])
+            Args:
+                model (TwoStateGaussianHMM or hmmlearn.GaussianHMM)
+        """
+
+        self._initial = model.startprob_
+        self._training_history = list(model.monitor_.history)
+
+        self._trans_probs = {}
+        self._trans_probs[0] = {}
+        self._trans_probs[1] = {}
 
-        model.fit(emis_array)
-        set_params(self, model)
+        self._trans_probs[0][0] = model.transmat_[0, 0]
+        self._trans_probs[0][1] = model.transmat_[0, 1]
+        self._trans_probs[1][1] = model.transmat_[1, 1]
+        self._trans_probs[1][0] = model.transmat_[1, 0]
+
+        self._emissions[0] = {}
+        self._emissions[1] = {}
+        self._emissions[0]["mean"] = model.means_[0][0]
+        self._emissions[1]["mean"] = model.means_[1][0]
+        self._emissions[0]["stdev"] = model.covars_[0][0][0]
+        self._emissions[1]["stdev"] = model.covars_[1][0][0]
 
         if self._emissions[0]["mean"] > self._emissions[1]["mean"]:
             self.swap_params_by_state()
 
+    def to_dict(self):
+        """
+            Returns model parameters as a JSON-serializable dictionary.
+        """
+
+        return {
+            "initial": [float(prob) for prob in self._initial],
+            "trans_probs": [[float(self._trans_probs[i][j]) for j in (0, 1)] for i in (0, 1)],
+            "emissions": [{"mean": float(self._emissions[i]["mean"]), "stdev": float(self._emissions[i]["stdev"])} for i in (0, 1)],
+            "dur_thresh": None if self._dur_thresh is None else int(self._dur_thresh),
+        }
+
+    def from_dict(self, params):
+        """
+            Sets model parameters from the output of to_dict.
+
+            Args:
+                params (dict)
+        """
+
+        self._initial = np.array(params["initial"], dtype=float)
+        self._trans_probs = {i: {j: params["trans_probs"][i][j] for j in (0, 1)} for i in (0, 1)}
+        self._emissions = {i: dict(params["emissions"][i]) for i in (0, 1)}
+        self._dur_thresh = params["dur_thresh"]
+
     def extract_params_from_verts(self, master_df):
         """
             Transition and emission probabilites are derived from the user's placement of verticies.
 
             Args:
-                master_array (numpy array)
-                training_verts (list): vertex objects created off of the user's placements
+                master_df (DataFrame): data spanning the user's vertices with bout_state annotated
         """
 
-        init = master_df["bout_state"].value_counts().apply(lambda x: x / len(master_df))
-        self._initial = init.round(7).to_numpy()
-
         master_array = niq_misc.df_to_array(master_df)
+        emissions = master_array[:, 1].astype(float)
+        states = master_array[:, 2].astype(int)
+
+        state_counts = np.bincount(states, minlength=2)[:2]
+        self._initial = np.round(state_counts / len(states), 7)
 
         for state in self._hidden_states:
+            state_emissions = emissions[states == state]
             self._emissions[state] = {}
-            self._emissions[state]["mean"] = statistics.mean(row[1] for row in master_array if row[2] == state)
-            self._emissions[state]["stdev"] = statistics.stdev(row[1] for row in master_array if row[2] == state)
-
-            self._emissions[state]["mean"] = np.mean([row[1] for row in master_array if row[2] == state])
-            self._emissions[state]["stdev"] = np.std([row[1] for row in master_array if row[2] == state])
-
-        trans_probs = {outer_state: {inner_state: 0 for inner_state in self._hidden_states} for outer_state in self._hidden_states}
+            self._emissions[state]["mean"] = state_emissions.mean()
+            self._emissions[state]["stdev"] = state_emissions.std()
 
-        prev_state = int(master_array[0, 2])
-        for state in master_array[1:, 2]:
-            trans_probs[prev_state][int(state)] += 1
-            prev_state = state
+        # Count transitions by encoding each (previous state, current state) pair as a single integer
+        pair_counts = np.bincount(states[:-1] * 2 + states[1:], minlength=4)[:4].reshape(2, 2)
 
         # Convert from counts to probabilites
-        for outer_state in self._hidden_states:
-            dict_sum = sum(trans_probs[outer_state].values())
-            for inner_state in self._hidden_states:
-                trans_probs[outer_state][inner_state] /= dict_sum
+        trans_probs = pair_counts / pair_counts.sum(axis=1)[:, np.newaxis]
+        self._trans_probs = {
+            outer_state: {inner_state: trans_probs[outer_state, inner_state] for inner_state in self._hidden_states}
+            for outer_state in self._hidden_states
+        }
 
-        self._trans_probs = trans_probs
         self.auto_dur_thresh(master_array)
 
         # Temperature change from previous data point should always be larger for on-bouts
@@ -139,19 +225,13 @@ class HMM(object):
                 master_array (numpy array)
         """
 
-        counts = []
-        cur_state = master_array[0, 2]
-        count = 0
+        lengths = niq_misc.run_length_encode(master_array[:, 2])[2]
 
-        for state in master_array[:, 2]:
-            if state == cur_state:
-                count += 1
-            else:
-                counts.append(count)
-                count = 0
-                cur_state = abs(cur_state - 1)
+        # The final run is cut off by the end of the data, so it is excluded unless it is the only one
+        if len(lengths) > 1:
+            lengths = lengths[:-1]
 
-        self._dur_thresh = round(min(counts) / 4)
+        self._dur_thresh = round(int(lengths.min()) / 4)
 
     def normalize_params(self, gui):
         """
@@ -180,108 +260,162 @@ class HMM(object):
 
         master_array = niq_misc.df_to_array(master_df)
 
+        # Very long recordings are decoded in blocks to keep memory use bounded
+        if len(master_array) > VITERBI_CHUNK_SIZE:
+            return self.viterbi(master_array, chunk_size=VITERBI_CHUNK_SIZE)
+
+        log_emis = self.get_log_emissions(master_array[:, 1])
+
         # Run viterbi to get expected states for each input data point
-        return self.viterbi(master_array)
+        return self.viterbi(master_array, log_emis=log_emis)
+
+    def get_log_emissions(self, emis_array):
+        """
+            Gets the log probability of every temperature change occurring in each state. The resulting matrix
+            can be shared by all decoding methods for a given input.
+
+            Args:
+                emis_array (numpy array): vector of temperature change values (emissions)
 
-    def viterbi(self, master_array):
+            Returns:
+                log_emis (numpy array): N x 2 array where column 0 = off-bout and column 1 = on-bout
+        """
+
+        return niq_emissions.get_log_emission_matrix(emis_array, self._emissions)
+
+    def get_log_trans_probs(self):
+        """
+            Returns 2 x 2 array of log transition probabilities where [i, j] is the transition from state i to state j.
+        """
+
+        with np.errstate(divide="ignore"):
+            return np.log([[self._trans_probs[i][j] for j in (0, 1)] for i in (0, 1)])
+
+    def get_log_initial(self):
+        """ Returns log initial state probabilities. """
+
+        # Avoid divide by 0 warning
+        return np.log([init if init != 0 else 1e-10 for init in self._initial[:2]])
+
+    def viterbi(self, master_array, log_emis=None, chunk_size=None):
         """ 
             Determines the most likly sequence of states given HMM parameters and a sequence of emission values.
+            Log emission and transition probabilities are computed once for the entire input and backpointers
+            are stored in a compact int8 array.
+
+            If chunk_size is provided, master_array is instead decoded in blocks of that many rows. Only the path
+            scores at the start of each block are retained during the forward pass; backpointers are regenerated
+            one block at a time during traceback, so memory use does not grow with the length of the recording.
+            Both modes return identical results.
 
             Args:
                 master_array (numpy array)
+                log_emis (numpy array): precomputed output of get_log_emissions for master_array
+                chunk_size (int): number of rows per block for bounded-memory decoding
         """
 
-        def get_cumu_prob(self, state, val, mean=None, stdev=None, pseudocount=1e-12):
-            """
-                Gets the cumulative probability for a temperature change occurring in a given state.
+        if chunk_size is not None and chunk_size < len(master_array):
+            return self.chunked_viterbi(master_array, chunk_size)
 
-                Args:
-                    state (int): 1 = on-bout, 0 = off-bout
-                    val (float): temperature change from previous (emission)
-                    mean (float): mean emission for this state
-                    stdev (float): standard deviation for this state
-                    pseudocount (float): default value if probability is 0 (avoids downstream errors)
-            """
+        if log_emis is None:
+            log_emis = self.get_log_emissions(master_array[:, 1])
 
-            if mean is None:
-                mean = float(self._emissions[state]["mean"])
+        log_trans = self.get_log_trans_probs()
+        log_init = self.get_log_initial()
 
-            if stdev is None:
-                stdev = float(self._emissions[state]["stdev"])
+        prev_0 = log_init[0] + log_emis[0, 0]
+        prev_1 = log_init[1] + log_emis[0, 1]
 
-            erf_input = (val - mean) / (stdev * (2 ** 0.5))
-            erf_val = math.erf(erf_input)
-            main_prob = (0.5 * (1 + erf_val)) if state == 1 else (1 - (0.5 * (1 + erf_val)))
+        backpointers, prev_0, prev_1 = _viterbi_forward(log_emis, log_trans, prev_0, prev_1)
 
-            if main_prob == 0:
-                main_prob = pseudocount
-            return main_prob
+        # Ties are resolved in favor of the off-bout state
+        last_state = 1 if prev_1 > prev_0 else 0
+        return _viterbi_traceback(backpointers, last_state).astype(np.int8)
 
-        def get_traceback(traceback, last_origin):
-            """
-                Args:
-                    traceback (list of dicts): holds "map" of optimal path through states
-                    last_origin (int): starting state
-
-                Returns:
-                    tb (string): optimal sequence of states
-            """
-
-            tb = ""
-            for pos in reversed(traceback):
-                prev_origin = pos[int(last_origin)]
-                tb += str(prev_origin)
-                last_origin = prev_origin
+    def chunked_viterbi(self, master_array, chunk_size):
+        """
+            Checkpointed form of viterbi for very long recordings.
 
-            return tb
+            Every block after the first overlaps the preceding block by one row so that the transition into the
+            block is scored. The forward pass stores the path scores for that overlapping row (the checkpoint).
+            The traceback then walks the blocks in reverse, re-running the forward recursion from each checkpoint
+            to regenerate that block's backpointers only.
 
-        def update_probs(row, previous):
-            """
-                Args:
-                    row (numpy array): single row from master_array
-                    previous (dict): probabilities corrisponding to each state possibility
+            Args:
+                master_array (numpy array)
+                chunk_size (int): number of rows per block
+        """
 
-                Returns:
-                    next_prob (dict): probabilities corrisponding to transitions from each state
-                    tb (dict): ideal state transition from this position
-            """
-            cur_prob = {}
-            next_prob = {}
-            tb = {}
+        size = len(master_array)
+        chunk_size = max(int(chunk_size), 2)
+        log_trans = self.get_log_trans_probs()
+        log_init = self.get_log_initial()
+
+        # Block boundaries; block i covers rows [starts[i], stops[i])
+        starts = list(range(0, size, chunk_size))
+        stops = starts[1:] + [size]
+        # Blocks after the first begin on the last row of the previous block
+        starts = [0] + [start - 1 for start in starts[1:]]
+
+        def block_emissions(i):
+            return self.get_log_emissions(master_array[starts[i] : stops[i], 1])
+
+        # Forward pass -- keep only the scores entering each block
+        first_emis = block_emissions(0)
+        prev_0 = log_init[0] + first_emis[0, 0]
+        prev_1 = log_init[1] + first_emis[0, 1]
+        checkpoints = []
+        for i in range(len(starts)):
+            checkpoints.append((prev_0, prev_1))
+            log_emis = first_emis if i == 0 else block_emissions(i)
+            _, prev_0, prev_1 = _viterbi_forward(log_emis, log_trans, prev_0, prev_1)
+
+        del first_emis
+
+        # Traceback -- regenerate backpointers block by block
+        states = np.empty(size, dtype=np.int8)
+        last_state = 1 if prev_1 > prev_0 else 0
+        for i in reversed(range(len(starts))):
+            backpointers, _, _ = _viterbi_forward(block_emissions(i), log_trans, *checkpoints[i])
+            path = _viterbi_traceback(backpointers, last_state)
+            states[starts[i] : stops[i]] = path
+
+            # First row of this block is the last row of the previous block
+            last_state = int(path[0])
+
+        return states
+
+    def posterior(self, master_array, log_emis=None):
+        """
+            Runs the forward-backward algorithm to get the posterior probability of each data point being part of
+            an on-bout. Unlike viterbi, this reflects how confident the model is in every individual assignment.
 
-            for next_state in self._hidden_states:
-                for cur_state in self._hidden_states:
-                    cur_prob[cur_state] = previous[cur_state] + np.log10(self._trans_probs[cur_state][next_state])
+            Args:
+                master_array (numpy array)
+                log_emis (numpy array): precomputed output of get_log_emissions for master_array
 
-                origin = max(cur_prob, key=cur_prob.get)
-                next_prob[next_state] = np.log10(get_cumu_prob(self, next_state, row[1])) + cur_prob[origin]
-                tb[next_state] = origin
+            Returns:
+                p_on (numpy array): posterior probability of the on-bout state for each row
+        """
 
-            return next_prob, tb
+        master_array = niq_misc.df_to_array(master_array)
 
-        traceback = []
-        first_row = master_array[0]
+        if log_emis is None:
+            log_emis = self.get_log_emissions(master_array[:, 1])
 
-        # First set of probabilites are calculated differently
-        previous = {}
-        # Avoid divide by 0 warning
-        init_0 = self._initial[0] if self._initial[0] != 0 else 1e-10
-        init_1 = self._initial[1] if self._initial[1] != 0 else 1e-10
-        previous[0] = np.log10(init_0) + np.log10(get_cumu_prob(self, 0, first_row[1]))
-        previous[1] = np.log10(init_1) + np.log10(get_cumu_prob(self, 1, first_row[1]))
+        posteriors, _, _ = _forward_backward(log_emis, self.get_log_trans_probs(), self.get_log_initial())
+        return posteriors[:, 1]
 
-        for row in master_array[1:, :]:
-            update_previous, update_tb = update_probs(row, previous)
-            previous = update_previous
-            traceback.append(update_tb)
+    def decode_by_posterior(self, p_on, thresh=0.5):
+        """
+            Assigns states by thresholding posterior on-bout probabilities rather than by the Viterbi path.
 
-        result = str(max(previous, key=previous.get))
-        result += get_traceback(traceback, result)
+            Args:
+                p_on (numpy array): output of posterior
+                thresh (float): minimum posterior probability for a data point to be called on-bout
+        """
 
-        # Reverse result and convert to integers
-        result = list(map(int, result[::-1]))
-        # Convert to numpy array and return
-        return np.array(result)
+        return (np.asarray(p_on) >= thresh).astype(np.int8)
 
     def build_model_from_entries(self, gui):
         """
@@ -329,3 +463,458 @@ class HMM(object):
         replace_entry(gui.on_mean_E, round(self._emissions[1]["mean"], 7))
         replace_entry(gui.off_stdev_E, round(self._emissions[0]["stdev"], 7))
         replace_entry(gui.on_stdev_E, round(self._emissions[1]["stdev"], 7))
+
+
+def _viterbi_forward(log_emis, log_trans, prev_0, prev_1):
+    """
+        Runs the Viterbi recursion across a block of emissions.
+
+        Args:
+            log_emis (numpy array): N x 2 array of log emission probabilities
+            log_trans (numpy array): 2 x 2 array of log transition probabilities
+            prev_0 (float): path score for the off-bout state at the first row of log_emis
+            prev_1 (float): path score for the on-bout state at the first row of log_emis
+
+        Returns:
+            backpointers (numpy array): N x 2 int8 array holding the optimal previous state for each row and
+                                        state (first row is unused)
+            prev_0 (float): final path score for the off-bout state
+            prev_1 (float): final path score for the on-bout state
+    """
+
+    size = len(log_emis)
+    from_0 = bytearray(size)
+    from_1 = bytearray(size)
+
+    # Python floats keep the per-row loop free of numpy scalar overhead
+    trans_00, trans_01 = float(log_trans[0, 0]), float(log_trans[0, 1])
+    trans_10, trans_11 = float(log_trans[1, 0]), float(log_trans[1, 1])
+    prev_0, prev_1 = float(prev_0), float(prev_1)
+    emis_0 = log_emis[:, 0].tolist()
+    emis_1 = log_emis[:, 1].tolist()
+
+    for i in range(1, size):
+        stay_0 = prev_0 + trans_00
+        switch_0 = prev_1 + trans_10
+        switch_1 = prev_0 + trans_01
+        stay_1 = prev_1 + trans_11
+
+        # Ties are resolved in favor of the off-bout origin
+        if switch_0 > stay_0:
+            from_0[i] = 1
+            stay_0 = switch_0
+
+        if stay_1 > switch_1:
+            from_1[i] = 1
+            switch_1 = stay_1
+
+        prev_0 = emis_0[i] + stay_0
+        prev_1 = emis_1[i] + switch_1
+
+    backpointers = np.empty((size, 2), dtype=np.int8)
+    backpointers[:, 0] = np.frombuffer(from_0, dtype=np.int8)
+    backpointers[:, 1] = np.frombuffer(from_1, dtype=np.int8)
+
+    return backpointers, prev_0, prev_1
+
+
+def _viterbi_traceback(backpointers, last_state):
+    """
+        Recovers the optimal state path from Viterbi backpointers without stepping through each row.
+
+        Each row of backpointers maps the state at that row to the state of the previous row. Rows where both
+        states share an origin fix the previous state outright ("anchors"); between anchors the state is carried
+        backwards, flipping wherever the origins are swapped.
+
+        Args:
+            backpointers (numpy array): N x 2 int8 array from _viterbi_forward
+            last_state (int): state assigned to the final row
+
+        Returns:
+            path (numpy array): optimal state for each row
+    """
+
+    size = len(backpointers)
+    origin_0 = backpointers[1:, 0]
+    origin_1 = backpointers[1:, 1]
+
+    is_anchor = np.empty(size, dtype=bool)
+    is_anchor[:-1] = origin_0 == origin_1
+    is_anchor[-1] = True
+
+    anchor_vals = np.empty(size, dtype=np.int64)
+    anchor_vals[:-1] = origin_0
+    anchor_vals[-1] = last_state
+
+    # Parity of swaps accumulated from the start of the array
+    swapped = (origin_0 == 1) & (origin_1 == 0)
+    parity = np.zeros(size, dtype=np.int64)
+    parity[1:] = np.cumsum(swapped) & 1
+
+    # Index of the nearest anchor at or after each row
+    indices = np.arange(size)
+    next_anchor = np.where(is_anchor, indices, size)
+    next_anchor = np.minimum.accumulate(next_anchor[::-1])[::-1]
+
+    return anchor_vals[next_anchor] ^ parity[next_anchor] ^ parity
+
+
+def _forward_backward(log_emis, log_trans, log_init):
+    """
+        Scaled forward-backward pass for the two-state model.
+
+        Each row of emission probabilities is shifted by its maximum in log space before exponentiation and the
+        forward/backward variables are renormalized at every step, so no value underflows regardless of input
+        length. The log-likelihood is recovered from the scaling factors.
+
+        Args:
+            log_emis (numpy array): N x 2 array of log emission probabilities
+            log_trans (numpy array): 2 x 2 array of log transition probabilities
+            log_init (numpy array): log initial state probabilities
+
+        Returns:
+            posteriors (numpy array): N x 2 array of state probabilities for each row
+            log_likelihood (float): log probability of the emission sequence given the model
+            trans_counts (numpy array): 2 x 2 array of expected transition counts
+    """
+
+    row_max = np.maximum(log_emis[:, 0], log_emis[:, 1])
+    emis_0 = np.exp(log_emis[:, 0] - row_max)
+    emis_1 = np.exp(log_emis[:, 1] - row_max)
+    trans = np.exp(log_trans)
+    init = np.exp(log_init)
+
+    # Forward: alpha[t] is proportional to alpha[t - 1] @ trans * emis[t]
+    first = init * (emis_0[0], emis_1[0])
+    e0, e1 = emis_0[1:], emis_1[1:]
+    alpha_0, alpha_1 = _propagate(
+        first / first.sum(), trans[0, 0] * e0, trans[0, 1] * e1, trans[1, 0] * e0, trans[1, 1] * e1
+    )
+
+    # Backward: beta[t] is proportional to trans @ (emis[t + 1] * beta[t + 1]), run as a forward pass in reverse
+    e0, e1 = e0[::-1], e1[::-1]
+    beta_0, beta_1 = _propagate(
+        np.array([0.5, 0.5]), trans[0, 0] * e0, trans[1, 0] * e0, trans[0, 1] * e1, trans[1, 1] * e1
+    )
+    beta_0, beta_1 = beta_0[::-1], beta_1[::-1]
+
+    posteriors = np.empty((len(log_emis), 2))
+    np.multiply(alpha_0, beta_0, out=posteriors[:, 0])
+    np.multiply(alpha_1, beta_1, out=posteriors[:, 1])
+    posteriors /= (posteriors[:, 0] + posteriors[:, 1])[:, np.newaxis]
+
+    # Scaling factor of each forward step (probability of emission t given emissions before it)
+    pred_0 = alpha_0[:-1] * trans[0, 0] + alpha_1[:-1] * trans[1, 0]
+    pred_1 = alpha_0[:-1] * trans[0, 1] + alpha_1[:-1] * trans[1, 1]
+    scales = pred_0 * emis_0[1:] + pred_1 * emis_1[1:]
+    log_likelihood = float(math.log(first.sum()) + np.log(scales).sum() + row_max.sum())
+
+    # Expected number of transitions from state i (at t) to state j (at t + 1), normalized per step
+    next_0 = emis_0[1:] * beta_0[1:]
+    next_1 = emis_1[1:] * beta_1[1:]
+    norm = alpha_0[:-1] * (trans[0, 0] * next_0 + trans[0, 1] * next_1) + alpha_1[:-1] * (trans[1, 0] * next_0 + trans[1, 1] * next_1)
+    weighted_0 = alpha_0[:-1] / norm
+    weighted_1 = alpha_1[:-1] / norm
+    trans_counts = trans * np.array([
+        [weighted_0.dot(next_0), weighted_0.dot(next_1)],
+        [weighted_1.dot(next_0), weighted_1.dot(next_1)],
+    ])
+
+    return posteriors, log_likelihood, trans_counts
+
+
+def _propagate(start, a, b, c, d):
+    """
+        Applies a sequence of 2 x 2 matrices to a starting row vector, normalizing the vector after each step:
+        v[t + 1] is proportional to v[t] @ [[a[t], b[t]], [c[t], d[t]]].
+
+        The recursion is sequential, so rather than stepping through every row in Python the input is split into
+        roughly sqrt(N) blocks. The product of each block's matrices is built with vectorized operations across all
+        blocks at once, the (short) chain of block products is walked to get the vector entering each block, and
+        the vectors within every block are then filled in together.
+
+        Args:
+            start (numpy array): normalized starting vector
+            a, b, c, d (numpy arrays): matrix entries for each step
+
+        Returns:
+            v_0, v_1 (numpy arrays): components of the normalized vector before each step and after the last
+    """
+
+    size = len(a)
+    if size == 0:
+        return np.array([float(start[0])]), np.array([float(start[1])])
+
+    block_size = max(int(math.sqrt(size)), 1)
+    block_count = -(-size // block_size)
+
+    # Pad with identity matrices so every block is full
+    pad = block_count * block_size - size
+    if pad:
+        ones, zeros = np.ones(pad), np.zeros(pad)
+        a, b, c, d = np.concatenate((a, ones)), np.concatenate((b, zeros)), np.concatenate((c, zeros)), np.concatenate((d, ones))
+
+    # Row j holds step j of every block
+    a, b, c, d = (np.ascontiguousarray(m.reshape(block_count, block_size).T) for m in (a, b, c, d))
+
+    # Normalized product of the matrices in each block
+    pa, pb, pc, pd = np.ones(block_count), np.zeros(block_count), np.zeros(block_count), np.ones(block_count)
+    for j in range(block_size):
+        pa, pb, pc, pd = pa * a[j] + pb * c[j], pa * b[j] + pb * d[j], pc * a[j] + pd * c[j], pc * b[j] + pd * d[j]
+        norm = pa + pb + pc + pd
+        pa /= norm
+        pb /= norm
+        pc /= norm
+        pd /= norm
+
+    # Vector entering each block
+    entry_0, entry_1 = [0.0] * block_count, [0.0] * block_count
+    v0, v1 = float(start[0]), float(start[1])
+    for k, (ka, kb, kc, kd) in enumerate(zip(pa.tolist(), pb.tolist(), pc.tolist(), pd.tolist())):
+        entry_0[k], entry_1[k] = v0, v1
+        v0, v1 = v0 * ka + v1 * kc, v0 * kb + v1 * kd
+        total = v0 + v1
+        v0 /= total
+        v1 /= total
+
+    # Fill in every block simultaneously
+    out_0, out_1 = np.empty((block_size, block_count)), np.empty((block_size, block_count))
+    v0, v1 = np.array(entry_0), np.array(entry_1)
+    for j in range(block_size):
+        out_0[j], out_1[j] = v0, v1
+        v0, v1 = v0 * a[j] + v1 * c[j], v0 * b[j] + v1 * d[j]
+        total = v0 + v1
+        v0 /= total
+        v1 /= total
+
+    # Back to row order; the final vector has passed through any padding unchanged
+    v_0 = np.append(out_0.T.ravel()[:size], v0[-1])
+    v_1 = np.append(out_1.T.ravel()[:size], v1[-1])
+
+    return v_0, v_1
+
+
+def set_starting_params(model, emis_array, seed=None):
+    """
+        Provides initial values for Baum Welch training.
+
+        Args:
+            model (TwoStateGaussianHMM or hmmlearn.GaussianHMM)
+            emis_array (numpy array): vector of temperature change values
+            seed (int): if provided, starting parameters are randomized using this seed
+    """
+
+    if seed is None:
+        model.startprob_ = np.array([0.5, 0.5])
+        model.transmat_ = np.array([[0.98, 0.02], [0.02, 0.98]])
+        # model.transmat_ = np.array([[0.9999, 0.0001], [0.0001, 0.9999]])
+        model.means_ = np.array([[0.001], [-0.001]])
+        model.covars_ = np.array([[0.001], [0.001]])
+        return
+
+    rng = np.random.RandomState(seed)
+    emissions = np.ravel(emis_array)
+
+    # Bouts span many data points, so only strongly self-transitioning starts are drawn
+    stay = rng.uniform(0.9, 0.999, size=2)
+
+    model.startprob_ = rng.dirichlet([1, 1])
+    model.transmat_ = np.array([[stay[0], 1 - stay[0]], [1 - stay[1], stay[1]]])
+    model.means_ = np.percentile(emissions, rng.uniform(5, 95, size=2)).reshape(2, 1)
+    model.covars_ = (max(emissions.var(), 1e-10) * rng.uniform(0.05, 1, size=2)).reshape(2, 1)
+
+
+def fit_restart(emis_array, lengths, seed, tol, n_iter, backend=DEFAULT_TRAINING_BACKEND):
+    """
+        Fits a single Baum Welch restart. Defined at the module level so it can be run in a worker process.
+
+        Args:
+            emis_array (numpy array): vector of temperature change values
+            lengths (list of ints): length of each independent sequence concatenated in emis_array
+            seed (int): seed for randomized starting parameters (None for the default starting parameters)
+            tol (float): convergence threshold for the gain in log-likelihood between iterations
+            n_iter (int): maximum number of iterations
+            backend (str): "native" or "hmmlearn"
+
+        Returns:
+            model (TwoStateGaussianHMM or hmmlearn.GaussianHMM): fitted model
+            log_likelihood (float): log-likelihood of emis_array under the fitted model
+            iters (int): number of iterations run
+            secs (float): wall time of the fit
+    """
+
+    start = time.time()
+
+    model = new_training_model(backend, tol, n_iter)
+    set_starting_params(model, emis_array, seed)
+    model.fit(emis_array, lengths)
+
+    return model, model.score(emis_array, lengths), model.monitor_.iter, time.time() - start
+
+
+def new_training_model(backend, tol, n_iter):
+    """
+        Creates an untrained two-state Gaussian HMM for Baum Welch training.
+
+        Args:
+            backend (str): "native" for TwoStateGaussianHMM or "hmmlearn" for hmmlearn.hmm.GaussianHMM
+            tol (float): convergence threshold for the gain in log-likelihood between iterations
+            n_iter (int): maximum number of iterations
+    """
+
+    if backend == "native":
+        return TwoStateGaussianHMM(tol=tol, n_iter=n_iter)
+
+    if backend == "hmmlearn":
+        # Only imported when selected
+        from hmmlearn import hmm
+
+        return hmm.GaussianHMM(n_components=2, tol=tol, n_iter=n_iter, algorithm="baum_welch", init_params="")
+
+    raise ValueError(f"Unknown training backend: {backend}")
+
+
+class ConvergenceHistory(object):
+    """
+        Tracks the log-likelihood of each EM iteration. Mirrors the attributes of hmmlearn's ConvergenceMonitor used
+        by NestIQ, but keeps the full history.
+
+        Attributes:
+            tol (float): convergence threshold for the gain in log-likelihood between iterations
+            n_iter (int): maximum number of iterations
+            history (list of floats): log-likelihood computed at each iteration
+            iter (int): number of iterations run
+    """
+
+    def __init__(self, tol, n_iter):
+        self.tol = tol
+        self.n_iter = n_iter
+        self.history = []
+        self.iter = 0
+
+    def report(self, log_likelihood):
+        self.history.append(log_likelihood)
+        self.iter += 1
+
+    @property
+    def converged(self):
+        return self.iter == self.n_iter or (len(self.history) >= 2 and self.history[-1] - self.history[-2] < self.tol)
+
+
+class TwoStateGaussianHMM(object):
+    """
+        Baum Welch (EM) training of a two-state HMM with one-dimensional Gaussian emissions. Follows
+        hmmlearn.hmm.GaussianHMM (diagonal covariance, default priors) so either can be used for training, but
+        uses the shared vectorized forward-backward pass rather than a general n-state implementation.
+
+        Attributes:
+            tol (float): convergence threshold for the gain in log-likelihood between iterations
+            n_iter (int): maximum number of iterations
+            startprob_ (numpy array): initial state probabilities
+            transmat_ (numpy array): 2 x 2 transition probabilities
+            means_ (numpy array): 2 x 1 emission means
+            covars_ (numpy array): 2 x 1 x 1 emission variances (set as 2 x 1)
+            monitor_ (ConvergenceHistory)
+    """
+
+    # Same defaults as hmmlearn.hmm.GaussianHMM
+    covars_prior = 1e-2
+    covars_weight = 1
+
+    def __init__(self, tol=1e-2, n_iter=10):
+        self.tol = tol
+        self.n_iter = n_iter
+        self.startprob_ = None
+        self.transmat_ = None
+        self.means_ = None
+        self._covars = None
+        self.monitor_ = ConvergenceHistory(tol, n_iter)
+
+    @property
+    def covars_(self):
+        return self._covars[:, :, np.newaxis]
+
+    @covars_.setter
+    def covars_(self, covars):
+        self._covars = np.asarray(covars, dtype=float).reshape(2, 1)
+
+    def _split(self, emis_array, lengths):
+        """ Splits concatenated emissions into individual sequences. """
+
+        emis_array = np.asarray(emis_array, dtype=float).ravel()
+        if lengths is None:
+            return [emis_array]
+
+        return np.split(emis_array, np.cumsum(lengths)[:-1])
+
+    def _e_step(self, sequences):
+        """
+            Accumulates expected sufficient statistics across all sequences.
+
+            Returns:
+                stats (dict): "start", "trans", "post", "obs" and "obs**2" totals
+                log_likelihood (float)
+        """
+
+        stats = {"start": np.zeros(2), "trans": np.zeros((2, 2)), "post": np.zeros(2), "obs": np.zeros(2), "obs**2": np.zeros(2)}
+        log_likelihood = 0.0
+
+        with np.errstate(divide="ignore"):
+            log_trans = np.log(self.transmat_)
+            log_init = np.log(self.startprob_)
+
+        for seq in sequences:
+            log_emis = niq_emissions.get_gaussian_log_pdf_matrix(seq, self.means_, self._covars)
+            posteriors, seq_likelihood, trans_counts = _forward_backward(log_emis, log_trans, log_init)
+
+            log_likelihood += seq_likelihood
+            stats["start"] += posteriors[0]
+            stats["trans"] += trans_counts
+            stats["post"] += posteriors.sum(axis=0)
+            stats["obs"] += seq.dot(posteriors)
+            stats["obs**2"] += (seq ** 2).dot(posteriors)
+
+        return stats, log_likelihood
+
+    def _m_step(self, stats):
+        """ Updates parameters from expected sufficient statistics (hmmlearn's update rules and priors). """
+
+        startprob = np.where(self.startprob_ == 0, 0, stats["start"])
+        self.startprob_ = startprob / startprob.sum()
+
+        transmat = np.where(self.transmat_ == 0, 0, stats["trans"])
+        self.transmat_ = transmat / transmat.sum(axis=1)[:, np.newaxis]
+
+        post = stats["post"]
+        means = stats["obs"] / post
+        cv_num = stats["obs**2"] - 2 * means * stats["obs"] + means ** 2 * post
+        cv_den = max(self.covars_weight - 1, 0) + post
+
+        self.means_ = means.reshape(2, 1)
+        self.covars_ = (self.covars_prior + cv_num) / np.maximum(cv_den, 1e-5)
+
+    def fit(self, emis_array, lengths=None):
+        """
+            Runs EM until the log-likelihood gain drops below tol or n_iter iterations are reached.
+
+            Args:
+                emis_array (numpy array): vector of temperature change values
+                lengths (list of ints): length of each independent sequence concatenated in emis_array
+        """
+
+        sequences = self._split(emis_array, lengths)
+        self.monitor_ = ConvergenceHistory(self.tol, self.n_iter)
+
+        for _ in range(self.n_iter):
+            stats, log_likelihood = self._e_step(sequences)
+            self._m_step(stats)
+            self.monitor_.report(log_likelihood)
+            if self.monitor_.converged:
+                break
+
+        return self
+
+    def score(self, emis_array, lengths=None):
+        """ Log-likelihood of emis_array under the current parameters. """
+
+        return self._e_step(self._split(emis_array, lengths))[1]
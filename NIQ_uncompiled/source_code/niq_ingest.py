@@ -0,0 +1,1032 @@
+import bz2
+import codecs
+import csv
+import datetime
+import gzip
+import io
+import json
+import lzma
+import math
+import re
+import zipfile
+from itertools import islice
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import niq_cache
+import niq_misc
+
+# Data file types accepted as input
+INPUT_SUFFIXES = (".csv", ".html")
+
+# Single-file compression formats accepted for CSV input, decompressed while reading
+COMPRESSION_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# Byte order marks and the encodings they identify, longest first so UTF-32 is not mistaken for UTF-16
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# Encodings tried in order for files without a byte order mark; latin-1 accepts any byte sequence
+FALLBACK_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+# Number of bytes read at a time when scanning input files
+SCAN_BLOCK_BYTES = 2 ** 24
+
+# Number of lines of an input file parsed at a time
+CHUNK_ROWS = 100000
+
+# Number of lines at the top of a CSV file searched for the header block of a logger export
+LOGGER_HEAD_LINES = 50
+
+# Date/time formats of logger exports; the family matching the most rows of a file is used for the whole file
+MONTH_FIRST_FORMATS = niq_misc.DATETIME_FORMATS + (
+    r"%m/%d/%y %I:%M:%S %p", r"%m/%d/%y %I:%M %p", r"%m/%d/%Y %I:%M:%S %p", r"%m/%d/%Y %I:%M %p",
+    r"%Y-%m-%d %H:%M:%S", r"%Y-%m-%d %H:%M",
+)
+DAY_FIRST_FORMATS = (
+    r"%d/%m/%Y %H:%M:%S", r"%d/%m/%Y %H:%M", r"%d/%m/%y %H:%M:%S", r"%d/%m/%y %H:%M",
+    r"%d/%m/%Y %I:%M:%S %p", r"%d/%m/%Y %I:%M %p", r"%d.%m.%Y %H:%M:%S", r"%d.%m.%Y %H:%M",
+    r"%d %b %Y %H:%M:%S", r"%d %b %Y %H:%M", r"%Y-%m-%d %H:%M:%S", r"%Y-%m-%d %H:%M",
+)
+
+# Temperature reading optionally followed by its unit (e.g. "24.5", "24.5 °C", "76.1F")
+TEMPER_PATTERN = r"^([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\s*(?:°|º|deg\.?)?\s*([CcFf])?$"
+
+# Unit given in a column header (e.g. "Temp, °F (LGR S/N: 1234)", "Temperature (C)")
+HEADER_UNIT_PATTERN = re.compile(r"(?:°|º|\bdeg\.?)\s*([CF])\b|\(\s*([CF])\s*\)|,\s*([CF])\b", re.IGNORECASE)
+
+
+class IngestReport(object):
+    """
+        Result of reading and validating a single input file. The file is read and parsed exactly once; if no
+        errors are found, df holds the data in the form used to build the master DataFrame.
+
+        Attributes:
+            path (pathlib.Path): input file
+            df (DataFrame): data_point, date_time, egg_temper and air_temper columns (None if errors were found)
+            air_valid (bool): False if air temperatures are missing or invalid
+            time_interval (int): mean number of seconds between readings
+            encoding (str): text encoding the file was decoded with
+            errors (list of tuples): (title, message) for each problem preventing the file from being analyzed
+            warnings (list of tuples): (title, message) for each less severe problem
+            rejected (dict): reason -> line numbers (1-based) of the input file affected
+            gaps (DataFrame): discontinuities in the date/time column (see find_datetime_gaps)
+            master_df (DataFrame): fully prepared master DataFrame (only set when loaded from the input cache)
+            logger_format (str): name of the logger export format detected (None for NestIQ CSV and HTML files)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.df = None
+        self.air_valid = True
+        self.time_interval = None
+        self.encoding = None
+        self.logger_format = None
+        self.errors = []
+        self.warnings = []
+        self.rejected = {}
+        self.gaps = None
+        self.master_df = None
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def reject(self, line_numbers, reason):
+        """
+            Records lines of the input file that were discarded (in full or in part).
+
+            Args:
+                line_numbers (numpy array): 1-based line numbers
+                reason (str): why the lines were discarded
+        """
+
+        if len(line_numbers) > 0:
+            self.rejected.setdefault(reason, []).extend(int(num) for num in line_numbers)
+
+    def get_rejection_log(self, max_listed=10):
+        """
+            Summarizes discarded lines for the run log, one entry per reason.
+
+            Args:
+                max_listed (int): number of line numbers listed for each reason
+        """
+
+        log = []
+        for reason, line_numbers in self.rejected.items():
+            listed = ", ".join(str(num) for num in line_numbers[:max_listed])
+            more = f" and {len(line_numbers) - max_listed} more" if len(line_numbers) > max_listed else ""
+            log.append(f"{self.path.name}: {len(line_numbers)} line(s) with {reason} (line {listed}{more})")
+
+        return log
+
+
+class LoggerFormat(object):
+    """
+        CSV export format of a commercial temperature logger.
+
+        Attributes:
+            name (str): name shown in the run log
+            signatures (tuple of str): lowercase text, any of which identifies the format in the top of the file
+            day_first (bool): True if the exporting software writes day/month/year dates by default
+    """
+
+    def __init__(self, name, signatures, day_first=False):
+        self.name = name
+        self.signatures = signatures
+        self.day_first = day_first
+
+
+LOGGER_FORMATS = (
+    LoggerFormat("HOBO", ("plot title:", "lgr s/n", "hoboware", "date time, gmt")),
+    LoggerFormat("iButton", ("ibutton", "1-wire", "thermochron", "ds1921", "ds1922", "ds1923", "date/time,unit,value")),
+    LoggerFormat("Tinytag", ("tinytag", "gemini data loggers", "easyview"), day_first=True),
+)
+
+
+def ingest_file(path):
+    """
+        Reads and validates an input file (CSV or NestIQ HTML plot).
+
+        Args:
+            path (str or pathlib.Path)
+
+        Returns:
+            report (IngestReport)
+    """
+
+    report = IngestReport(path)
+
+    if get_data_suffix(report.path) == ".html":
+        ingest_html(report)
+    else:
+        ingest_csv(report)
+
+    if report.ok and len(report.df) > 0:
+        delta_secs = (report.df["date_time"].iloc[-1] - report.df["date_time"].iloc[0]).total_seconds()
+        report.time_interval = round(delta_secs / len(report.df))
+
+    return report
+
+
+def get_archive_member(path):
+    """
+        Splits a path addressing a file inside a zip archive (e.g. "loggers.zip/B68-1.csv").
+
+        Args:
+            path (pathlib.Path)
+
+        Returns:
+            archive (pathlib.Path): zip file, or None if path is not inside an archive
+            member (str): name of the file within the archive
+    """
+
+    for parent in path.parents:
+        if parent.suffix.lower() == ".zip" and parent.is_file():
+            return parent, path.relative_to(parent).as_posix()
+
+    return None, None
+
+
+def get_data_suffix(path):
+    """
+        Returns the extension identifying the type of data in a file, ignoring any compression extension
+        (e.g. ".csv" for "B68-1.csv.gz").
+
+        Args:
+            path (pathlib.Path)
+    """
+
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] in COMPRESSION_OPENERS:
+        suffixes = suffixes[:-1]
+
+    return suffixes[-1] if suffixes else ""
+
+
+def get_input_stem(path):
+    """
+        Returns the file name of an input without its data and compression extensions.
+
+        Args:
+            path (pathlib.Path)
+    """
+
+    name = path.name
+    if path.suffix.lower() in COMPRESSION_OPENERS:
+        name = name[:-len(path.suffix)]
+
+    return Path(name).stem
+
+
+def is_compressed(path):
+    """ Returns True if path is compressed or addressed inside a zip archive. """
+
+    return path.suffix.lower() in COMPRESSION_OPENERS or get_archive_member(path)[0] is not None
+
+
+def input_exists(path):
+    """
+        Checks if an input file (possibly a member of a zip archive) exists.
+
+        Args:
+            path (pathlib.Path)
+    """
+
+    archive, member = get_archive_member(path)
+    if archive is None:
+        return path.is_file()
+
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            return member in zip_file.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def expand_input_paths(paths):
+    """
+        Replaces each zip archive in a list of input paths with the CSV files it contains, so that an archive of
+        logger files is analyzed as a multi-file run.
+
+        Args:
+            paths (list of pathlib.Paths)
+    """
+
+    expanded = []
+    for path in paths:
+        try:
+            if path.suffix.lower() == ".zip" and path.is_file():
+                with zipfile.ZipFile(path) as zip_file:
+                    members = sorted(
+                        name for name in zip_file.namelist()
+                        if get_data_suffix(Path(name)) == ".csv" and not name.startswith("__MACOSX/")
+                    )
+                expanded += [path / member for member in members]
+                continue
+        except (OSError, zipfile.BadZipFile):
+            # Unreadable archives are reported by input file validation
+            pass
+
+        expanded.append(path)
+
+    return expanded
+
+
+@contextmanager
+def open_input(path):
+    """
+        Opens an input file for binary reading. Compressed files and zip archive members are decompressed as
+        they are read, without being extracted to disk.
+
+        Args:
+            path (pathlib.Path)
+    """
+
+    archive, member = get_archive_member(path)
+    if archive is not None:
+        with zipfile.ZipFile(archive) as zip_file, zip_file.open(member) as f:
+            yield f
+    elif path.suffix.lower() in COMPRESSION_OPENERS:
+        with COMPRESSION_OPENERS[path.suffix.lower()](path, "rb") as f:
+            yield f
+    else:
+        with open(path, "rb") as f:
+            yield f
+
+
+def input_digest(path):
+    """
+        Computes a SHA-256 digest of the contents of an input file (see niq_cache.file_digest).
+
+        Args:
+            path (pathlib.Path)
+    """
+
+    # Digest the decompressed contents of archive members; other files are hashed as stored
+    if get_archive_member(path)[0] is not None:
+        with open_input(path) as f:
+            return niq_cache.stream_digest(f)
+
+    return niq_cache.file_digest(path)
+
+
+def read_text(path):
+    """
+        Reads the contents of a text file into memory, detecting its encoding.
+
+        Args:
+            path (pathlib.Path)
+
+        Returns:
+            text (str)
+            encoding (str): encoding used to decode the file
+    """
+
+    with open_input(path) as f:
+        return decode_bytes(f.read())
+
+
+def decode_bytes(raw):
+    """
+        Decodes file contents using the encoding indicated by a byte order mark if present, otherwise the first
+        of FALLBACK_ENCODINGS that succeeds.
+
+        Args:
+            raw (bytes)
+
+        Returns:
+            text (str)
+            encoding (str)
+    """
+
+    for bom, encoding in BOMS:
+        if raw.startswith(bom):
+            return raw[len(bom):].decode(encoding), encoding
+
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return raw.decode(encoding), encoding
+        except UnicodeDecodeError:
+            continue
+
+
+def scan_file(path):
+    """
+        Streams through a text file once, without holding it in memory, to detect its encoding and count its lines
+        and the largest number of cells in a line.
+
+        Args:
+            path (pathlib.Path)
+
+        Returns:
+            encoding (str): codec to open the file with (consumes any byte order mark)
+            line_count (int)
+            width (int): largest number of comma separated cells in a line
+    """
+
+    with open_input(path) as f:
+        head = f.read(4)
+
+    bom_encoding = next((encoding for bom, encoding in BOMS if head.startswith(bom)), None)
+
+    # UTF-16/32 files are not ASCII compatible and so are scanned as text
+    if bom_encoding is not None and bom_encoding != "utf-8":
+        encoding = "utf-16" if bom_encoding.startswith("utf-16") else "utf-32"
+        line_count, width = 0, 0
+        with open_input(path) as raw, io.TextIOWrapper(raw, encoding=encoding, newline="") as f:
+            for line in f:
+                line_count += 1
+                width = max(width, line.count(",") + 1)
+
+        return encoding, line_count, width
+
+    candidates = ["utf-8-sig"] if bom_encoding == "utf-8" else list(FALLBACK_ENCODINGS[:-1])
+    decoders = {encoding: codecs.getincrementaldecoder(encoding)() for encoding in candidates}
+
+    line_count, width = 0, 0
+    line_commas = 0  # Commas in the line continuing into the next block
+    ends_with_newline = True
+    with open_input(path) as f:
+        for block in iter(lambda: f.read(SCAN_BLOCK_BYTES), b""):
+            for encoding, decoder in list(decoders.items()):
+                try:
+                    decoder.decode(block)
+                except UnicodeDecodeError:
+                    del decoders[encoding]
+
+            block_array = np.frombuffer(block, dtype=np.uint8)
+            comma_counts = np.cumsum(block_array == ord(","))
+            newlines = np.flatnonzero(block_array == ord("\n"))
+
+            if len(newlines) > 0:
+                # Commas in each line ended within this block
+                per_line = np.diff(np.concatenate(([0], comma_counts[newlines])))
+                per_line[0] += line_commas
+                width = max(width, int(per_line.max()) + 1)
+                line_commas = int(comma_counts[-1] - comma_counts[newlines[-1]])
+            else:
+                line_commas += int(comma_counts[-1])
+
+            line_count += len(newlines)
+            ends_with_newline = block_array[-1] == ord("\n")
+
+    for encoding, decoder in list(decoders.items()):
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            del decoders[encoding]
+
+    # Last line without a trailing newline
+    if not ends_with_newline:
+        line_count += 1
+        width = max(width, line_commas + 1)
+
+    encoding = next((encoding for encoding in candidates if encoding in decoders), FALLBACK_ENCODINGS[-1])
+    return encoding, line_count, width
+
+
+def ingest_csv(report, chunk_rows=CHUNK_ROWS):
+    """
+        Loads a CSV input file into report.df. Lines with a non-numeric first cell (such as headers) are skipped,
+        only the first four cells of each line are used and the remaining rows are checked for sequential data
+        points, valid date/times and valid temperatures. Skipped lines below the first data row are recorded in
+        report.rejected; lines above it (headers) are expected and are not.
+
+        The file is parsed in chunks of chunk_rows lines, each converted straight into arrays allocated up front
+        for the whole file, so memory use stays close to that of the final data regardless of file size.
+
+        Exports of supported commercial loggers (see LOGGER_FORMATS) are detected from the top of the file and
+        handed to ingest_logger_csv.
+
+        Args:
+            report (IngestReport)
+            chunk_rows (int): number of lines parsed at a time
+    """
+
+    report.encoding, line_count, width = scan_file(report.path)
+    if line_count == 0:
+        report.errors.append(("Input File Error", "No data found in file."))
+        return
+
+    detected = detect_logger_format(read_head_lines(report.path, report.encoding))
+    if detected is not None:
+        ingest_logger_csv(report, *detected, line_count=line_count, width=width, chunk_rows=chunk_rows)
+        return
+
+    data_points = np.empty(line_count, dtype=np.int64)
+    date_times = np.empty(line_count, dtype="datetime64[ns]")
+    egg_tempers = np.empty(line_count)
+    air_tempers = np.empty(line_count)
+    line_numbers = np.empty(line_count, dtype=np.int64)
+
+    size = 0
+    data_seen = False
+    with open_input(report.path) as raw_file, io.TextIOWrapper(raw_file, encoding=report.encoding, newline="") as f:
+        # Rows with fewer cells than the widest row are padded with NaN; only the first four columns are used
+        # Blank lines are kept so that the index matches the line numbers of the file
+        # Quotes are kept as ordinary characters so that each line is split on its commas alone, as stray quotes in
+        # ignored columns must not join lines together
+        reader = pd.read_csv(
+            f, header=None, names=range(max(width, 4)), dtype=str, quoting=csv.QUOTE_NONE, skip_blank_lines=False,
+            chunksize=chunk_rows
+        )
+
+        for raw in reader:
+            raw = raw.iloc[:, :4].apply(lambda col: col.str.strip())
+            raw.index += 1
+
+            # Remove lines not conforming to expected format (such as headers)
+            first_cells = raw[0].fillna("")
+            # isdecimal rather than isnumeric, which also accepts characters such as "½" that int() cannot parse
+            is_data = first_cells.str.isdecimal()
+            is_blank = (raw.fillna("") == "").all(axis=1)
+            is_body = (is_data.cumsum() > 0) | data_seen
+            data_seen = data_seen or bool(is_data.any())
+            report.reject(raw.index[is_body & ~is_data & ~is_blank & (first_cells == "")], "no data point")
+            report.reject(raw.index[is_body & ~is_data & (first_cells != "")], "non-numeric data point")
+
+            raw = raw[is_data]
+            chunk = slice(size, size + len(raw))
+            if chunk.stop > len(data_points):
+                # Line count can be underestimated for files with unusual line endings
+                new_len = max(chunk.stop, 2 * len(data_points))
+                data_points, date_times, egg_tempers, air_tempers, line_numbers = (
+                    np.resize(array, new_len) for array in (data_points, date_times, egg_tempers, air_tempers, line_numbers)
+                )
+
+            data_points[chunk] = raw[0].astype(np.int64).to_numpy()
+            date_times[chunk] = niq_misc.convert_datetime_column(raw[1].fillna(""), errors="coerce").to_numpy()
+            egg_tempers[chunk] = pd.to_numeric(raw[2], errors="coerce").to_numpy(dtype=float)
+            air_tempers[chunk] = pd.to_numeric(raw[3], errors="coerce").to_numpy(dtype=float)
+            line_numbers[chunk] = raw.index.to_numpy()
+            size = chunk.stop
+
+    finish_ingest(
+        report, data_points[:size], date_times[:size], egg_tempers[:size], air_tempers[:size], line_numbers[:size]
+    )
+
+
+def finish_ingest(report, data_points, date_times, egg_tempers, air_tempers, line_numbers):
+    """
+        Validates the readings parsed from a CSV file and stores them in report.df if no errors are found.
+
+        Args:
+            report (IngestReport)
+            data_points (numpy array): data point number of each reading
+            date_times (numpy array): datetime64 values (NaT where invalid)
+            egg_tempers (numpy array): egg temperatures (NaN where invalid)
+            air_tempers (numpy array): air temperatures (NaN where missing or invalid), None if the file has none
+            line_numbers (numpy array): line of the input file each reading was taken from
+    """
+
+    # A logger download cut off mid-line leaves a partial last line, which is dropped rather than failing the file
+    if has_partial_last_line(date_times, egg_tempers, air_tempers):
+        report.reject(line_numbers[-1:], "partial last line (dropped)")
+        data_points, date_times, egg_tempers, line_numbers = (
+            array[:-1] for array in (data_points, date_times, egg_tempers, line_numbers)
+        )
+        if air_tempers is not None:
+            air_tempers = air_tempers[:-1]
+
+    if len(data_points) == 0:
+        report.errors.append(("Input File Error", "No data found in file."))
+        return
+
+    problems = []
+
+    # Check if data points are continuous and sequential
+    non_sequential = np.flatnonzero(np.diff(data_points) != 1)
+    if len(non_sequential) > 0:
+        i = non_sequential[0]
+        problems.append((i + 1, "Data Point Error", (
+            f"Error after data point {data_points[i]}. Data point number is not sequential with regard to previous data point."
+        )))
+
+    invalid_dts = np.flatnonzero(np.isnat(date_times))
+    if len(invalid_dts) > 0:
+        i = invalid_dts[0]
+        problems.append((i, "Date/Time Error", (
+            f"Invalid date/time found for data point {data_points[i]}.  Date/Time should be in MM/DD/YYYY HH:MM (:SS) format."
+        )))
+
+    invalid_eggs = np.flatnonzero(np.isnan(egg_tempers))
+    if len(invalid_eggs) > 0:
+        i = invalid_eggs[0]
+        problems.append((i, "Temperature Error", f"Invalid temperature given for data point {data_points[i]}."))
+
+    # Report the problem found earliest in the file first
+    report.errors = [(title, message) for _, title, message in sorted(problems, key=lambda problem: problem[0])]
+
+    if air_tempers is None:
+        report.air_valid = False
+        report.warnings.append(("Air Temperature Warning", (
+            "No air temperature column found. Air temperatures will not be plotted or included in statistical output."
+        )))
+        invalid_airs = []
+    else:
+        invalid_airs = np.flatnonzero(np.isnan(air_tempers))
+
+    if len(invalid_airs) > 0:
+        report.air_valid = False
+        report.reject(line_numbers[invalid_airs], "missing or invalid air temperature (air temperatures discarded)")
+        report.warnings.append(("Air Temperature Warning", (
+            f"Invalid air temperature detected for data point {data_points[invalid_airs[0]]}. "
+            + "Air temperatures will not be plotted or included in statistical output."
+        )))
+
+    if not report.ok:
+        return
+
+    # Data points have been checked to be continuous
+    report.df = pd.DataFrame({
+        "data_point": data_points,
+        "date_time": date_times,
+        "egg_temper": np.round(egg_tempers, 4, out=egg_tempers),
+        "air_temper": np.round(air_tempers, 4, out=air_tempers) if report.air_valid else 0.0,
+    })
+
+    report.gaps = find_datetime_gaps(date_times, data_points)
+    if len(report.gaps) > 0:
+        report.warnings.append(get_gap_warning(report.gaps))
+
+
+def has_partial_last_line(date_times, egg_tempers, air_tempers):
+    """
+        Checks if the last reading is missing a value that the reading before it has (the date/time, egg
+        temperature or air temperature), as happens when writing the file was interrupted mid-line.
+
+        Args:
+            date_times (numpy array): datetime64 values (NaT where invalid)
+            egg_tempers (numpy array): egg temperatures (NaN where invalid)
+            air_tempers (numpy array): air temperatures (NaN where missing or invalid), None if the file has none
+    """
+
+    if len(date_times) < 2:
+        return False
+
+    columns = [(date_times, np.isnat), (egg_tempers, np.isnan)]
+    if air_tempers is not None:
+        columns.append((air_tempers, np.isnan))
+
+    return any(is_missing(values[-1]) and not is_missing(values[-2]) for values, is_missing in columns)
+
+
+def read_head_lines(path, encoding, max_lines=LOGGER_HEAD_LINES):
+    """
+        Reads the first lines of a text input file.
+
+        Args:
+            path (pathlib.Path)
+            encoding (str)
+            max_lines (int)
+
+        Returns:
+            lines (list of str): lines without line endings
+    """
+
+    with open_input(path) as raw_file, io.TextIOWrapper(raw_file, encoding=encoding, newline="") as f:
+        return [line.rstrip("\r\n") for line in islice(f, max_lines)]
+
+
+def detect_logger_format(head_lines):
+    """
+        Identifies a commercial logger export from the top of a CSV file. The format is recognized by text its
+        software writes in the header block, and the column header row is the first line naming both a date/time
+        column and a temperature column.
+
+        Args:
+            head_lines (list of str): first lines of the file
+
+        Returns:
+            detected (tuple): (LoggerFormat, index of the column header line, column roles from get_logger_columns),
+                              or None if the file is not a supported logger export
+    """
+
+    head_text = "\n".join(head_lines).lower()
+    logger_format = next((fmt for fmt in LOGGER_FORMATS if any(sig in head_text for sig in fmt.signatures)), None)
+    if logger_format is None:
+        return None
+
+    for i, cells in enumerate(csv.reader(head_lines)):
+        columns = get_logger_columns(cells)
+        if columns is not None:
+            return logger_format, i, columns
+
+    return None
+
+
+def get_logger_columns(header):
+    """
+        Assigns a role to each cell of a candidate column header row of a logger export.
+
+        Args:
+            header (list of str): cells of the row
+
+        Returns:
+            columns (dict): role -> column position, with "temps" mapping to a list of (position, unit) pairs in file
+                            order where unit is "C", "F" or None if not given in the header; None if the row does not
+                            name both a date/time and a temperature column
+    """
+
+    columns = {"temps": []}
+    for pos, cell in enumerate(header):
+        name = cell.strip().lower()
+        if "record" not in columns and name in ("#", "no", "no.", "record", "record number", "reading", "index"):
+            columns["record"] = pos
+        elif "date" in name and "time" in name:
+            columns.setdefault("datetime", pos)
+        elif name.startswith("date"):
+            columns.setdefault("date", pos)
+        elif name.startswith("time"):
+            columns.setdefault("time", pos)
+        elif name in ("unit", "units"):
+            columns.setdefault("unit", pos)
+        elif "temp" in name or name == "value" or "°" in name:
+            unit = HEADER_UNIT_PATTERN.search(cell)
+            columns["temps"].append((pos, next(g for g in unit.groups() if g).upper() if unit else None))
+
+    # Some exports give the full date/time in a column headed "Time"
+    if "datetime" not in columns and "date" not in columns and "time" in columns:
+        columns["datetime"] = columns.pop("time")
+
+    has_datetime = "datetime" in columns or ("date" in columns and "time" in columns)
+    if not has_datetime or not columns["temps"]:
+        return None
+
+    return columns
+
+
+def parse_logger_tempers(values, header_unit, units=None):
+    """
+        Converts a column of logger temperature readings to degrees Celsius.
+
+        Args:
+            values (pd.Series): readings, optionally with a unit suffix and decimal comma
+            header_unit (str): "C", "F" or None, unit given in the column header
+            units (pd.Series): contents of the unit column of the export, if any
+
+        Returns:
+            tempers (numpy array): temperatures in degrees Celsius (NaN where a reading could not be parsed)
+    """
+
+    parts = values.str.replace(",", ".", regex=False).str.strip().str.extract(TEMPER_PATTERN)
+    tempers = pd.to_numeric(parts[0], errors="coerce").to_numpy(dtype=float, copy=True)
+
+    # Unit priority: unit column, suffix of the reading, column header, then Celsius
+    unit = parts[1].str.upper()
+    if units is not None:
+        unit = units.str.strip().str.lstrip("°º").str[:1].str.upper().where(units.notna(), unit)
+    is_fahrenheit = (unit.fillna(header_unit or "C") == "F").to_numpy()
+
+    tempers[is_fahrenheit] = (tempers[is_fahrenheit] - 32) * 5 / 9
+    return tempers
+
+
+def parse_logger_datetimes(dt_strings, families):
+    """
+        Parses logger date/times with the format family matching the most rows.
+
+        Args:
+            dt_strings (pd.Series): date/time strings
+            families (tuple): format families (tuples of str) in order of preference
+
+        Returns:
+            date_times (pd.Series): datetime64 values (NaT where invalid)
+            formats (tuple of str): format family used
+    """
+
+    best = None
+    for formats in families:
+        date_times = niq_misc.convert_datetime_column(dt_strings, errors="coerce", formats=formats)
+        if best is None or date_times.isna().sum() < best[0].isna().sum():
+            best = (date_times, formats)
+
+    return best
+
+
+def ingest_logger_csv(report, logger_format, header_index, columns, line_count, width, chunk_rows=CHUNK_ROWS):
+    """
+        Loads a commercial logger export into report.df. The header block above the column header row is skipped,
+        separate date and time columns are combined and temperatures in degrees Fahrenheit are converted to
+        Celsius. The first temperature column is used as egg temperature and the second, if any, as air
+        temperature. Logger events (rows without a temperature reading but with an entry in an event column, such
+        as "Coupler Attached") are skipped and data points are numbered from the record numbers of the export less
+        the number of events recorded before them, so that only genuinely missing records break the sequence.
+
+        Args:
+            report (IngestReport)
+            logger_format (LoggerFormat)
+            header_index (int): index of the column header line
+            columns (dict): column roles (see get_logger_columns)
+            line_count (int): number of lines in the file
+            width (int): upper bound of the number of cells in any line
+            chunk_rows (int): number of lines parsed at a time
+    """
+
+    report.logger_format = logger_format.name
+    (egg_col, egg_unit), (air_col, air_unit) = (columns["temps"] + [(None, None)])[:2]
+    # Date/time formats of the software's default locale are preferred
+    dt_families = (MONTH_FIRST_FORMATS, DAY_FIRST_FORMATS)
+    if logger_format.day_first:
+        dt_families = dt_families[::-1]
+
+    date_times = np.empty(line_count, dtype="datetime64[ns]")
+    egg_tempers = np.empty(line_count)
+    air_tempers = np.empty(line_count) if air_col is not None else None
+    line_numbers = np.empty(line_count, dtype=np.int64)
+    records = np.empty(line_count, dtype=np.int64)
+    event_records = []
+
+    role_cols = {pos for role, pos in columns.items() if role != "temps"} | {pos for pos, _ in columns["temps"]}
+    event_cols = [pos for pos in range(max(width, 1)) if pos not in role_cols]
+
+    size = 0
+    with open_input(report.path) as raw_file, io.TextIOWrapper(raw_file, encoding=report.encoding, newline="") as f:
+        reader = pd.read_csv(
+            f, header=None, names=range(max(width, 1)), dtype=str, skiprows=header_index + 1,
+            skip_blank_lines=False, chunksize=chunk_rows
+        )
+
+        for raw in reader:
+            raw = raw.apply(lambda col: col.str.strip())
+            raw.index += header_index + 2
+
+            filled = raw.fillna("")
+            is_blank = (filled == "").all(axis=1)
+            if "record" in columns:
+                row_records = pd.to_numeric(filled[columns["record"]], errors="coerce")
+                is_numbered = row_records.notna() & (row_records % 1 == 0)
+                report.reject(raw.index[~is_blank & ~is_numbered], "non-numeric data point")
+            else:
+                row_records = pd.Series(0, index=raw.index)
+                is_numbered = ~is_blank
+
+            is_event = is_numbered & (filled[egg_col] == "") & (filled[event_cols] != "").any(axis=1)
+            report.reject(raw.index[is_event], "logger event (no reading)")
+            event_records.extend(row_records[is_event].astype(np.int64))
+            keep = ~is_blank & ~is_event & is_numbered
+            raw, row_records = raw[keep], row_records[keep]
+            if len(raw) == 0:
+                continue
+
+            if "datetime" in columns:
+                dt_strings = raw[columns["datetime"]].fillna("")
+            else:
+                dt_strings = raw[columns["date"]].fillna("") + " " + raw[columns["time"]].fillna("")
+
+            # Format family is settled on the first chunk so that all rows are read the same way
+            dt_series, dt_formats = parse_logger_datetimes(dt_strings, dt_families)
+            dt_families = (dt_formats,)
+
+            chunk = slice(size, size + len(raw))
+            if chunk.stop > len(date_times):
+                new_len = max(chunk.stop, 2 * len(date_times))
+                date_times, egg_tempers, line_numbers, records = (
+                    np.resize(array, new_len) for array in (date_times, egg_tempers, line_numbers, records)
+                )
+                if air_tempers is not None:
+                    air_tempers = np.resize(air_tempers, new_len)
+
+            units = raw[columns["unit"]] if "unit" in columns else None
+            date_times[chunk] = dt_series.to_numpy()
+            egg_tempers[chunk] = parse_logger_tempers(raw[egg_col].fillna(""), egg_unit, units)
+            if air_tempers is not None:
+                air_tempers[chunk] = parse_logger_tempers(raw[air_col].fillna(""), air_unit, units)
+            line_numbers[chunk] = raw.index.to_numpy()
+            records[chunk] = row_records.to_numpy(dtype=np.int64)
+            size = chunk.stop
+
+    if "record" in columns:
+        # Record numbers also count the skipped event rows
+        data_points = records[:size] - np.searchsorted(np.sort(event_records), records[:size])
+    else:
+        data_points = np.arange(1, size + 1, dtype=np.int64)
+
+    if air_tempers is not None:
+        air_tempers = air_tempers[:size]
+
+    finish_ingest(report, data_points, date_times[:size], egg_tempers[:size], air_tempers, line_numbers[:size])
+
+
+def ingest_html(report):
+    """
+        Loads the original input data embedded in a NestIQ HTML plot into report.df.
+
+        Args:
+            report (IngestReport)
+    """
+
+    text, report.encoding = read_text(report.path)
+    lines = text.splitlines()
+
+    if "<!--NestIQ input data" not in lines:
+        report.errors.append(("Input File Error", "HTML file does not contain the necessary information for processing."))
+        return
+
+    i = lines.index("<!--NestIQ input data") + 1
+    input_dict = json.loads(lines[i])
+    size = len(input_dict["egg_temper"])
+
+    # Restore data point column
+    dp_start = int(input_dict["first_dp"])
+
+    # Restore date/time column
+    first_dt = niq_misc.convert_to_datetime(input_dict["first_dt"])
+    time_d = datetime.timedelta(seconds=int(input_dict["dt_interval"]))
+
+    report.df = pd.DataFrame({
+        "data_point": np.arange(dp_start, dp_start + size),
+        "date_time": [first_dt + (x * time_d) for x in range(0, size)],
+        "egg_temper": input_dict["egg_temper"],
+        "air_temper": input_dict["air_temper"],
+    })
+
+
+def find_datetime_gaps(date_times, data_points):
+    """
+        Finds all discontinuities in the date/time column in one pass.
+
+        When readings are at least a minute apart, consecutive readings are compared. Shorter intervals are
+        compared across the number of readings after which a whole number of minutes should have passed, as
+        date/times are usually only recorded to the minute.
+
+        Args:
+            date_times (numpy array): datetime64 values
+            data_points (numpy array): data point number of each reading
+
+        Returns:
+            gaps (DataFrame): one row per discontinuity with the data point at which it was detected, the date/times
+                              at the start and end of the gap and the number of readings missing (negative if
+                              there are more readings than expected, e.g. duplicated or backwards date/times)
+    """
+
+    gap_cols = ["data_point", "start", "end", "missing_points"]
+    date_times = np.asarray(date_times, dtype="datetime64[ns]")
+    if len(date_times) < 2:
+        return pd.DataFrame(columns=gap_cols)
+
+    delta_secs = (date_times[-1] - date_times[0]) / np.timedelta64(1, "s")
+    interval = int(round(delta_secs / len(date_times)))
+    if interval <= 0:
+        return pd.DataFrame(columns=gap_cols)
+
+    if interval >= 60:
+        step = 1
+        expected_secs = interval
+        ends = np.arange(1, len(date_times))
+    else:
+        # Identify first change in date/time
+        first_change = int(np.argmax(date_times != date_times[0]))
+
+        # Find least common denominator with one minute
+        LCD = interval * 60 // math.gcd(interval, 60)
+        step = LCD // interval  # There should be a whole number minute change after this many data points
+        expected_secs = (LCD // 60) * 60  # That whole number of minutes is this
+        ends = np.arange(first_change + step, len(date_times), step)
+
+    spans = (date_times[ends] - date_times[ends - step]) / np.timedelta64(1, "s")
+    bad = spans != expected_secs
+    ends = ends[bad]
+
+    return pd.DataFrame({
+        "data_point": np.asarray(data_points)[ends],
+        "start": date_times[ends - step],
+        "end": date_times[ends],
+        "missing_points": np.round(spans[bad] / interval).astype(int) - step,
+    }, columns=gap_cols)
+
+
+def get_gap_warning(gaps, max_listed=10):
+    """
+        Builds a single warning describing all date/time discontinuities.
+
+        Args:
+            gaps (DataFrame): output of find_datetime_gaps
+            max_listed (int): number of gaps described individually
+    """
+
+    listed = "\n".join(
+        f"Data point {row.data_point}: {row.start} to {row.end} ({row.missing_points} missing)"
+        for row in gaps.iloc[:max_listed].itertuples()
+    )
+    more = f"\n... and {len(gaps) - max_listed} more (see console)" if len(gaps) > max_listed else ""
+
+    return ("Date/time Warning", (
+        f"{len(gaps)} discontinuous date/time(s) found. The run will continue, but this could cause inaccurate "
+        + f"statistical output.\n\n{listed}{more}"
+    ))
+
+
+def save_prepared(path, report, master_df):
+    """
+        Writes a prepared master DataFrame and the details of the report it was built from to an npz file.
+
+        Args:
+            path (str or pathlib.Path): destination file
+            report (IngestReport)
+            master_df (DataFrame): output of init_master_df
+    """
+
+    gaps = None
+    if report.gaps is not None:
+        gaps = {
+            "data_point": report.gaps["data_point"].astype(int).tolist(),
+            "start": report.gaps["start"].astype(str).tolist(),
+            "end": report.gaps["end"].astype(str).tolist(),
+            "missing_points": report.gaps["missing_points"].astype(int).tolist(),
+        }
+
+    meta = {
+        "columns": list(master_df.columns),
+        "air_valid": report.air_valid,
+        "time_interval": report.time_interval,
+        "warnings": report.warnings,
+        "rejected": report.rejected,
+        "gaps": gaps,
+        "logger_format": report.logger_format,
+    }
+
+    columns = {f"col_{i}": master_df[col].to_numpy() for i, col in enumerate(master_df.columns)}
+    with open(path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **columns)
+
+
+def load_prepared(path, in_path):
+    """
+        Reads a file written by save_prepared.
+
+        Args:
+            path (str or pathlib.Path): npz file
+            in_path (str or pathlib.Path): input file the data was prepared from
+
+        Returns:
+            report (IngestReport): report with master_df set
+    """
+
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        master_df = pd.DataFrame({col: data[f"col_{i}"] for i, col in enumerate(meta["columns"])})
+
+    report = IngestReport(in_path)
+    report.master_df = master_df
+    report.air_valid = meta["air_valid"]
+    report.time_interval = meta["time_interval"]
+    report.warnings = [tuple(warning) for warning in meta["warnings"]]
+    report.rejected = meta["rejected"]
+    report.logger_format = meta.get("logger_format")
+
+    if meta["gaps"] is not None:
+        report.gaps = pd.DataFrame(meta["gaps"], columns=["data_point", "start", "end", "missing_points"])
+        report.gaps["start"] = pd.to_datetime(report.gaps["start"])
+        report.gaps["end"] = pd.to_datetime(report.gaps["end"])
+
+    return report
@@ -18,12 +18,23 @@ from tkinter import messagebox
 import niq_classes
 
 
+# Accepted date/time formats, in the order they are tried
+DATETIME_FORMATS = (r"%m/%d/%y %H:%M:%S", r"%m/%d/%y %H:%M", r"%m/%d/%Y %H:%M:%S", r"%m/%d/%Y %H:%M")
+
+# Encoding of the bout_state column of master_df; STATE_NAMES gives the vertex/bout type for each state
+OFF, ON, NO_STATE = 0, 1, 2
+STATE_NAMES = ("off", "on", "None")
+
+
 def convert_to_datetime(dt_string):
     """
         Converts Date/Time cell from master DataFrame to datetime.datetime object.
         
         Args:
                 dt_string (str): contents of date/time cell of input file provided by user
+
+        Raises:
+                ValueError: if dt_string does not match any accepted format
     """
 
     # Return input if already datetime object
@@ -31,27 +42,80 @@ def convert_to_datetime(dt_string):
         return dt_string
 
     # Try extracting date/time with various formats
-    while True:
+    for dt_format in DATETIME_FORMATS:
         with suppress(ValueError):
-            time_struct = time.strptime(dt_string, r"%m/%d/%y %H:%M:%S")
-            break
+            time_struct = time.strptime(dt_string, dt_format)
+            return datetime.datetime(*time_struct[0:6])
 
-        with suppress(ValueError):
-            time_struct = time.strptime(dt_string, r"%m/%d/%y %H:%M")
-            break
+    raise ValueError(f"Unrecognized date/time: {dt_string}")
 
-        with suppress(ValueError):
-            time_struct = time.strptime(dt_string, r"%m/%d/%Y %H:%M:%S")
-            break
 
-        with suppress(ValueError):
-            time_struct = time.strptime(dt_string, r"%m/%d/%Y %H:%M")
-            break
+def infer_datetime_format(dt_strings, sample_size=100, formats=DATETIME_FORMATS):
+    """
+        Determines which accepted date/time format fits a column of date/time strings by testing a sample.
 
-        
-    dt = datetime.datetime(*time_struct[0:6])
+        Args:
+                dt_strings (pd.Series): date/time strings
+                sample_size (int): number of rows tested
+                formats (tuple of str): candidate formats in order of preference
+
+        Returns:
+                dt_format (str): format matching the most sampled rows (None if no rows match)
+    """
+
+    sample = dt_strings.iloc[:sample_size].tolist()
+    best_format, best_count = None, 0
+    for dt_format in formats:
+        count = 0
+        for dt_string in sample:
+            with suppress(ValueError):
+                time.strptime(dt_string, dt_format)
+                count += 1
+
+        if count > best_count:
+            best_format, best_count = dt_format, count
 
-    return dt
+    return best_format
+
+
+def convert_datetime_column(dt_series, errors="raise", formats=DATETIME_FORMATS):
+    """
+        Converts an entire column of date/time strings to datetimes. The format is detected from a sample and the
+        column is parsed in one vectorized call; the few rows (if any) that do not fit are then parsed with the
+        remaining accepted formats. Gives the same result as applying convert_to_datetime to every row.
+
+        Args:
+                dt_series (pd.Series): contents of date/time column of input file provided by user
+                errors (str): "raise" or "coerce" (rows not matching an accepted format are set to NaT)
+                formats (tuple of str): accepted formats in order of preference
+
+        Raises:
+                ValueError: if errors="raise" and any rows do not match an accepted format (lists the offending rows)
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(dt_series):
+        return dt_series
+
+    dt_strings = dt_series.astype(str)
+    detected_format = infer_datetime_format(dt_strings, formats=formats)
+    formats = [detected_format] + [dt_format for dt_format in formats if dt_format != detected_format]
+
+    converted = pd.Series(pd.NaT, index=dt_strings.index, dtype="datetime64[ns]")
+    remaining = dt_strings
+    for dt_format in formats:
+        if dt_format is None or len(remaining) == 0:
+            continue
+
+        parsed = pd.to_datetime(remaining, format=dt_format, errors="coerce")
+        converted[parsed.index[parsed.notna()]] = parsed[parsed.notna()]
+        remaining = remaining[parsed.isna()]
+
+    if len(remaining) > 0 and errors == "raise":
+        listed = ", ".join(f"{index} ({dt_string})" for index, dt_string in remaining.iloc[:10].items())
+        more = f" and {len(remaining) - 10} more" if len(remaining) > 10 else ""
+        raise ValueError(f"Unrecognized date/time in {len(remaining)} row(s): {listed}{more}")
+
+    return converted
 
 
 def is_partial(df, first_index, last_index, expected_dur):
@@ -310,36 +374,23 @@ def get_verts_from_html(gui, in_file, alt=False):
 
 def extract_bouts_in_range(gui, total_bouts, first_index, last_index):
     """
-        Extracts vertices falling into a specified window of index values.
+        Extracts bouts whose middle falls into a specified window of index values using binary search.
 
         Args:
             gui (GUIClass)
-            total_bouts (list): every bout identified for the current input file
+            total_bouts (BoutTable): bouts of the current input file
             first_index (int)
             last_index (int)
 	"""
 
-    bouts_in_range = []
-    left_limit, right_limit = 0, 0
+    if len(total_bouts) < 1 or last_index < total_bouts.first[0] or first_index > total_bouts.last[-1]:
+        return total_bouts[:0]
 
-    if len(total_bouts) < 1 or last_index < total_bouts[0].first or first_index > total_bouts[-1].last:
-        return bouts_in_range
+    # Bouts are in order of occurrence, so a bout is in range if its middle falls between the two search positions
+    left_limit = np.searchsorted(total_bouts.middle, first_index, side="left")
+    right_limit = np.searchsorted(total_bouts.middle, last_index, side="right")
 
-    # Determine first bout in range
-    for i in range(len(total_bouts)):
-        if total_bouts[i].middle >= first_index:
-            left_limit = i
-            break
-
-    # Determine last bout in range
-    for i in range((len(total_bouts) - 1), -1, -1):
-        if total_bouts[i].middle <= last_index:
-            right_limit = i
-            break
-
-    bouts_in_range = total_bouts[left_limit : (right_limit + 1)]
-    bouts_in_range.sort(key=lambda x: x.first)
-    return bouts_in_range
+    return total_bouts[left_limit:right_limit]
 
 def get_date_blocks(gui):
     """
@@ -689,7 +740,7 @@ def write_stats(gui, date_blocks, master_block):
     indi_header = "Individual Bout Stats\n"
 
     indi_header += (
-        "Date,Bout Type,Start Time,End Time,Start Data Point,End Data Point,Duration (min),Egg Temp Change,Start Egg Temp,End Egg Temp,Mean Egg Temp, Egg Temp StDev,"
+        "Date,Bout Type,Start Time,End Time,Start Data Point,End Data Point,Duration (min),Egg Temp Change,Start Egg Temp,End Egg Temp,Mean Egg Temp, Egg Temp StDev,Mean Confidence,"
     )
 
     if gui.air_valid:
@@ -697,36 +748,54 @@ def write_stats(gui, date_blocks, master_block):
 
     bouts = master_block.bouts
 
+    # Per-bout statistics are computed for every bout at once from the shared temperature arrays
+    mean_egg_tempers = bouts.get_means(bouts.egg_tempers).tolist()
+    egg_temper_stdevs = bouts.get_stdevs(bouts.egg_tempers).tolist()
+    if gui.air_valid:
+        mean_air_tempers = bouts.get_means(bouts.air_tempers).tolist()
+        air_temper_stdevs = bouts.get_stdevs(bouts.air_tempers).tolist()
+
+    # Posteriors are only available for bouts decoded by the HMM (not those taken from an edited plot)
+    confidences = bouts.get_confidences()
+    if confidences is not None:
+        confidences = confidences.tolist()
+
+    firsts, lasts = bouts.first.tolist(), bouts.last.tolist()
+    durations, temper_changes = bouts.duration.tolist(), bouts.temper_change.tolist()
+
     bout_rows = []
     cur_date = ""
-    for bout in bouts:
+    for i in range(len(bouts)):
+        first, last = firsts[i], lasts[i]
+
         row = ""
         # Print date if it is the first row corresponding to this date
-        this_date = gui.master_df.loc[bout.first, "date_time"].strftime(r"%m/%d/%Y")
+        this_date = gui.master_df.loc[first, "date_time"].strftime(r"%m/%d/%Y")
         row += "," if this_date == cur_date else f"{this_date},"
         cur_date = this_date
 
-        row += f"{bout.bout_type},"
+        row += f"{bouts.bout_type[i]},"
 
         row += (
-            f"{gui.master_df.loc[bout.first, 'date_time'].strftime(r'%H:%M')},"
-            + f"{gui.master_df.loc[bout.last, 'date_time'].strftime(r'%H:%M')},"
-            + f"{gui.master_df.loc[bout.first, 'data_point']},"
-            + f"{gui.master_df.loc[bout.last, 'data_point']},"
-            + f"{bout.dur},"
-            + f"{bout.temper_change},"
-            + f"{gui.master_df.loc[bout.first, 'egg_temper']},"
-            + f"{gui.master_df.loc[bout.last, 'egg_temper']},"
-            + f"{bout.mean_egg_temper},"
-            + f"{bout.egg_temper_stdev},"
+            f"{gui.master_df.loc[first, 'date_time'].strftime(r'%H:%M')},"
+            + f"{gui.master_df.loc[last, 'date_time'].strftime(r'%H:%M')},"
+            + f"{gui.master_df.loc[first, 'data_point']},"
+            + f"{gui.master_df.loc[last, 'data_point']},"
+            + f"{durations[i]},"
+            + f"{temper_changes[i]},"
+            + f"{gui.master_df.loc[first, 'egg_temper']},"
+            + f"{gui.master_df.loc[last, 'egg_temper']},"
+            + f"{round(mean_egg_tempers[i], 3)},"
+            + f"{round(egg_temper_stdevs[i], 3)},"
+            + (f"{round(confidences[i], 3)}," if confidences is not None else ",")
         )
 
         if gui.air_valid:
             row += (
-                f"{gui.master_df.loc[bout.first, 'air_temper']},"
-                + f"{gui.master_df.loc[bout.last, 'air_temper']},"
-                + f"{bout.mean_air_temper},"
-                + f"{bout.air_temper_stdev}"
+                f"{gui.master_df.loc[first, 'air_temper']},"
+                + f"{gui.master_df.loc[last, 'air_temper']},"
+                + f"{round(mean_air_tempers[i], 3)},"
+                + f"{round(air_temper_stdevs[i], 3)}"
             )
 
         bout_rows.append(row)
@@ -1016,31 +1085,47 @@ def get_verts_from_master_df(master_df):
     if "bout_state" not in master_df.columns:
         return []
 
-    # Convert bout_states to integers
-    temp_df = master_df.copy()
-    int_states = temp_df.loc[:, "bout_state"].replace(["off", "on", "None"], [0, 1, 2])
-
-    # Create Boolean Series that stores if the state has changed
-    state_changed = int_states.diff().astype(bool)
-    state_changed.iloc[0] = False
-
-    # Extract indices of rows where the state changes
-    vert_indices = master_df[state_changed].index.tolist()
+    states = master_df["bout_state"].to_numpy()
+    egg_tempers = master_df["egg_temper"].to_numpy()
 
-    vertices = []
-    for index in vert_indices:
-        row = master_df.loc[index]
-        vertices.append(niq_classes.Vertex(index, row["egg_temper"], row["bout_state"]))
+    # Vertices are placed at the first row of every run of identical states
+    starts = run_length_encode(states)[0]
+    vertices = [niq_classes.Vertex(index, egg_tempers[index], STATE_NAMES[states[index]]) for index in starts.tolist()]
 
-    # Add vertices at begining and end of data set
+    # Add vertex at end of data set
     last = len(master_df) - 1
-    vertices.append(niq_classes.Vertex(0, master_df.loc[0, "egg_temper"], master_df.loc[0, "bout_state"]))
-    vertices.append(niq_classes.Vertex(last, master_df.loc[last, "egg_temper"], master_df.loc[last, "bout_state"]))
+    vertices.append(niq_classes.Vertex(last, egg_tempers[last], STATE_NAMES[states[last]]))
 
     vertices.sort(key=lambda x: x.index)
     return vertices
 
 
+def run_length_encode(states):
+    """
+        Splits a sequence of states into runs of consecutive identical values.
+
+        Args:
+            states (array-like): bout states
+
+        Returns:
+            starts (numpy array): index of the first element of each run
+            ends (numpy array): index of the last element of each run
+            lengths (numpy array): number of elements in each run
+            values (numpy array): state of each run
+    """
+
+    states = np.asarray(states)
+    if len(states) == 0:
+        empty = np.array([], dtype=int)
+        return empty, empty, empty, states[:0]
+
+    changes = np.flatnonzero(states[1:] != states[:-1]) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes - 1, [len(states) - 1]))
+
+    return starts, ends, ends - starts + 1, states[starts]
+
+
 def replace_entry(entry, new_value):
     entry.delete(0, "end")
     entry.insert(0, new_value)
@@ -1048,27 +1133,50 @@ def replace_entry(entry, new_value):
 
 def filter_by_dur(gui):
     """
-			Purges the master df of state clusters failing to meet a given duration threshold.
+			Purges the master df of state clusters failing to meet a given duration threshold by merging them into
+			the neighboring bouts. Merging can leave new short bouts, so passes are repeated until every bout that has
+			a neighboring bout meets the threshold. Each pass flips every other bout of a stretch of consecutive short
+			bouts, so that every flipped bout merges with at least one neighbor.
 
 			Args:
 					gui (GUI)
+
+			Returns:
+					df (pd.DataFrame): master_df with bout_state updated
+					bouts_dropped_locs (set): middle index of every bout merged away
 	"""
 
     dur_thresh = int(gui.dur_thresh_E.get())
     df = gui.master_df
     bouts_dropped_locs = set()
 
-    for bout in gui.master_block.bouts:
-        dur = bout.last - bout.first
-        # If duration threshold not met
-        if dur < dur_thresh:
-            # Set bout_state for corrisponding rows to that of adjacent row
-            new_state = "on" if bout.bout_type == "off" else "off"
-            df.loc[bout.first:bout.last, "bout_state"] = new_state
-            bouts_dropped_locs.add(bout.middle)
-            # Delete bout
-            gui.master_block.bouts.remove(bout)
+    if "bout_state" not in df.columns:
+        return df, bouts_dropped_locs
 
+    states = df["bout_state"].to_numpy().copy()
+    while True:
+        firsts, lasts, run_states, is_bout = get_bout_runs(states)
+
+        # Bouts failing the threshold that have another bout to merge into
+        has_neighbor = np.concatenate(([False], is_bout[:-1])) | np.concatenate((is_bout[1:], [False]))
+        short = np.flatnonzero(is_bout & (lasts - firsts < dur_thresh) & has_neighbor)
+        if len(short) == 0:
+            break
+
+        # Position of each short bout within its stretch of consecutive short bouts
+        is_stretch_start = np.concatenate(([True], np.diff(short) != 1))
+        positions = np.arange(len(short)) - np.flatnonzero(is_stretch_start)[np.cumsum(is_stretch_start) - 1]
+        dropped = short[positions % 2 == 0]
+
+        # Flip every row of the dropped runs
+        is_dropped = np.zeros(len(firsts), dtype=bool)
+        is_dropped[dropped] = True
+        flip = np.repeat(is_dropped, np.diff(np.append(firsts, len(states))))
+        states[flip] = np.where(states[flip] == OFF, ON, OFF)
+
+        bouts_dropped_locs.update(np.rint((firsts[dropped] + lasts[dropped]) / 2).astype(int).tolist())
+
+    df["bout_state"] = states
     return df, bouts_dropped_locs
 
 
@@ -1126,39 +1234,53 @@ def df_to_array(df):
 
     # Grab appropriate columns
     if "bout_state" in df.columns:
-        mod_df = df.loc[:, ["data_point", "delta_temper", "bout_state"]].copy()
-        # Convert bout stats to integers
-        mod_df.loc[:, "bout_state"].replace(["off", "on", "None"], [0, 1, 2], inplace=True)
+        mod_df = df.loc[:, ["data_point", "delta_temper", "bout_state"]]
     else:
         mod_df = df[["data_point", "delta_temper"]]
 
     return mod_df.to_numpy()
 
 
-def get_bouts_from_verts(gui, verts):
+def get_bout_runs(states):
     """
-            Extracts bout objects based on vertex locations.
+        Splits bout states into runs and determines the extent of the bout each run represents. Bouts end one row
+        before the next run begins; the final bout ends one row before the end of the data set.
 
-            Args:
-                    gui (GUIClass)
+        Args:
+            states (numpy array): bout states
+
+        Returns:
+            firsts (numpy array): index where each bout begins
+            lasts (numpy array): index where each bout ends
+            run_states (numpy array): state of each run
+            is_bout (numpy array): False for nighttime runs and a final run consisting of only the last row
     """
-    bouts = []
 
-    # Return if insufficient number of vertices supplied
-    if verts is None or len(verts) < 2:
-        return bouts
+    firsts, lasts, _, run_states = run_length_encode(states)
+    lasts[-1:] -= 1
 
-    # Create bout objects
-    cur_vert = verts[0]
-    for next_vert in verts[1:]:
-        # Skip if cur_vert is start of nighttime period
-        if cur_vert.vert_type != "None" and next_vert.index > cur_vert.index:
-            bouts.append(niq_classes.Bout(gui, cur_vert.index, next_vert.index - 1, cur_vert.vert_type)) 
+    return firsts, lasts, run_states, (run_states != NO_STATE) & (lasts >= firsts)
+
+
+def get_bouts_from_master_df(gui, master_df):
+    """
+        Segments the bout_state column of master_df into a table of bouts in one pass. Every run of identical
+        states other than NO_STATE is a bout (see get_bout_runs).
+
+        Args:
+            gui (GUIClass)
+            master_df (pd.DataFrame)
+
+        Returns:
+            bouts (BoutTable): bouts in order of occurrence
+    """
 
-        cur_vert = next_vert
+    states = master_df["bout_state"].to_numpy() if "bout_state" in master_df.columns else np.array([], dtype=np.int8)
+    firsts, lasts, run_states, is_bout = get_bout_runs(states)
+    firsts, lasts, run_states = firsts[is_bout], lasts[is_bout], run_states[is_bout]
+    bout_types = np.array(STATE_NAMES, dtype=object)[run_states.astype(int)]
 
-    bouts.sort(key=lambda x: x.first)
-    return bouts
+    return niq_classes.BoutTable(master_df, firsts, lasts, bout_types, gui.time_interval)
 
 def is_number(string):
     try:
@@ -7,6 +7,7 @@ from tkinter import filedialog
 import colorama
 from termcolor import colored
 
+import niq_ingest
 from configuration import load_config, save_config
 from niq_misc import replace_entry
 
@@ -26,7 +27,7 @@ def test_run(gui):
 def master_test(gui):
     """
         Run automated tests for unrestricted plotting/statistics, restricted plotting/statistics,
-        unsupervised learning and supervised learning.
+        unsupervised learning, supervised learning, plot editing and reading of logger exports.
     """
 
     def compare_stats(key, ref_path, test_path):
@@ -94,6 +95,38 @@ def master_test(gui):
 
         return mismatches
 
+    def compare_ingests(ref_path, test_path):
+        """
+            Load two input files and store discrepencies between the data read from them.
+
+            Args:
+                ref_path (pathlib.Path): Path to reference input file in NestIQ CSV format
+                test_path (pathlib.Path): Path to test input file
+        """
+
+        ref_report = niq_ingest.ingest_file(ref_path)
+        test_report = niq_ingest.ingest_file(test_path)
+
+        mismatches = dict()
+        if not test_report.ok:
+            mismatches["Errors"] = ("None", test_report.errors)
+            return mismatches
+
+        if ref_report.air_valid != test_report.air_valid:
+            mismatches["Air Valid"] = (ref_report.air_valid, test_report.air_valid)
+
+        if len(ref_report.df) != len(test_report.df):
+            mismatches["Rows"] = (len(ref_report.df), len(test_report.df))
+            return mismatches
+
+        for col in ref_report.df.columns:
+            differs = (ref_report.df[col] != test_report.df[col]).to_numpy()
+            if differs.any():
+                i = differs.argmax()
+                mismatches[f"{col} (row {i + 1})"] = (ref_report.df[col].iloc[i], test_report.df[col].iloc[i])
+
+        return mismatches
+
     # Initialization
     test_dir_path = gui.master_dir_path / "testing"
     test_out_dir = test_dir_path / "temp_output"
@@ -268,4 +301,29 @@ def master_test(gui):
                 + colored(str(values[0]), "yellow")
             )
 
+    # ---------------------------------Logger exports----------------------------------------
+    print(f"\n\nTesting logger exports")
+
+    for export_name in ("hobo_export", "ibutton_export", "tinytag_export"):
+        export_path = test_dir_path / "input" / f"{export_name}.csv"
+        export_ref_path = test_dir_path / "input" / f"ref_{export_name}.csv"
+
+        # Look for discrepencies in the data read
+        mismatches = dict()
+        mismatches = compare_ingests(export_ref_path, export_path)
+
+        # Notify user of mismatched values if any
+        if not mismatches:
+            print(colored(f"{export_name.upper()} PASSED".center(100, "-"), "green"))
+        else:
+            print(colored(f"{export_name.upper()} FAILED".center(100, "-"), "red"))
+            for key, values in mismatches.items():
+                print(
+                    colored(key, "yellow")
+                    + ": test value of "
+                    + colored(str(values[1]), "yellow")
+                    + " did not match reference "
+                    + colored(str(values[0]), "yellow")
+                )
+
     print(colored("TESTING COMPLETED".center(100, "-"), "blue"))